@@ -0,0 +1,64 @@
+import os
+from functools import lru_cache
+from html import escape
+from string import Template
+
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+static_dir = os.path.join(base_dir, "static")
+# Files in ./static are served at app/static/ (see .streamlit/config.toml) and cached by the browser
+static_url = "app/static"
+logo_source = os.path.join(base_dir, "Capture1.png")
+logo_name = "logo.png"
+logo_width = 600
+
+
+# Downscaled, optimized copy of the logo in the static folder, rebuilt when the source changes.
+# Returns the path to use with st.image when the static copy can't be built.
+def ensure_logo():
+    target = os.path.join(static_dir, logo_name)
+    try:
+        if os.path.getmtime(target) >= os.path.getmtime(logo_source):
+            return None
+    except OSError:
+        pass
+    try:
+        from PIL import Image
+
+        with Image.open(logo_source) as image:
+            height = round(image.height * logo_width / image.width)
+            resized = image.resize((logo_width, height), Image.LANCZOS)
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            resized.save(tmp_path, format="PNG", optimize=True)
+        os.replace(tmp_path, target)
+    except (ImportError, OSError):
+        return logo_source
+    return None
+
+
+def stylesheet_html():
+    return f'<link rel="stylesheet" href="{static_url}/style.css">'
+
+
+def logo_html():
+    return f'<img class="logo" src="{static_url}/{logo_name}" alt="mtl-slopes">'
+
+
+@lru_cache(maxsize=None)
+def load_template(name):
+    with open(os.path.join(base_dir, "templates", name)) as f:
+        return Template(f.read())
+
+
+# Station header and tables as one HTML block. Cached per (station, forecast values), so a given
+# snapshot renders once per process whatever the number of reruns.
+@lru_cache(maxsize=512)
+def station_card_html(title, trails, lifts, altitude_m, snow_24h, snow_48h):
+    return load_template("station_card.html").substitute(
+        title=escape(str(title)),
+        trails=escape(str(trails)),
+        lifts=escape(str(lifts)),
+        altitude_m=escape(str(altitude_m)),
+        snow_24h=escape(str(snow_24h)),
+        snow_48h=escape(str(snow_48h)),
+    )
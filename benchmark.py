@@ -0,0 +1,138 @@
+"""Reproducible data-path benchmark against the offline Open-Meteo stand-in.
+
+For every station and grid size, measures a cold rerun (fetch, transform and layer payload),
+a refresh once the model cells are known, a warm rerun served from the cached grid, upstream
+request count and bytes transferred.
+
+    python benchmark.py --sizes 10 20 30 --repeat 5 --latency 0.05 --output benchmark_results.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+from forecast_engine import (
+    assemble_station_grids,
+    batch_params,
+    data_types,
+    heatmap_points,
+    plan_station_grids,
+)
+from mock_open_meteo import default_cell_size, start_server
+from model_grid import ModelGridIndex
+from open_meteo_client import OpenMeteoClient
+from station_registry import station_grids
+
+
+horizons = list(range(6, 49, 6))
+
+
+def timed_fetch(grid, client, server, cell_index):
+    server.reset_stats()
+    started = time.perf_counter()
+    plan = plan_station_grids([grid], cell_index)
+    responses = client.get_json_many_sync([batch_params(chunk) for chunk in plan.chunks])
+    fetched = time.perf_counter()
+    station_grid = assemble_station_grids(plan, responses, cell_index)[0]
+    assembled = time.perf_counter()
+    return station_grid, fetched - started, assembled - fetched, dict(server.stats)
+
+
+def run_once(grid, client, server):
+    # Cold: nothing known about the model grid yet, so every point is requested
+    cell_index = ModelGridIndex()
+    station_grid, fetch_s, transform_s, stats = timed_fetch(grid, client, server, cell_index)
+    started = time.perf_counter()
+    payload = json.dumps(heatmap_points(station_grid, data_types[0], horizons[-1]))
+    payload_s = time.perf_counter() - started
+
+    # Refresh: the learned cell index lets us request one point per model cell
+    _, refresh_fetch_s, refresh_transform_s, refresh_stats = timed_fetch(grid, client, server, cell_index)
+
+    # A warm rerun only slices the cached grid and serializes the layer, for every slider position and type
+    warm = []
+    for data_type in data_types:
+        for forecast_hours in horizons:
+            warm_started = time.perf_counter()
+            json.dumps(heatmap_points(station_grid, data_type, forecast_hours))
+            warm.append(time.perf_counter() - warm_started)
+
+    return {
+        "cold_rerun_s": fetch_s + transform_s + payload_s,
+        "fetch_s": fetch_s,
+        "transform_s": transform_s,
+        "payload_s": payload_s,
+        "warm_rerun_s": statistics.median(warm),
+        "requests": stats["requests"],
+        "errors": stats["errors"],
+        "bytes_received": stats["bytes_sent"],
+        "refresh_s": refresh_fetch_s + refresh_transform_s,
+        "refresh_locations": refresh_stats["locations"],
+        "refresh_bytes_received": refresh_stats["bytes_sent"],
+        "points": len(station_grid.lats),
+        "model_cells": len(station_grid.cumulative),
+        "grid_bytes": station_grid.cumulative.nbytes,
+        "layer_payload_bytes": len(payload),
+    }
+
+
+def run_benchmark(sizes, repeat, latency, error_rate, seed, cell_size):
+    server = start_server(latency=latency, error_rate=error_rate, seed=seed, cell_size=cell_size)
+    client = OpenMeteoClient(base_url=server.url)
+    results = []
+    try:
+        for station, grid in station_grids.items():
+            for size in sizes:
+                runs = [run_once((*grid[:4], size), client, server) for _ in range(repeat)]
+                summary = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+                summary.update(station=station, points_per_side=size, repeat=repeat)
+                results.append(summary)
+    finally:
+        client.close()
+        server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the forecast data path offline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 30], help="Grid points per side")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock upstream delay per request, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cell-size", type=float, default=default_cell_size, help="Mock model grid spacing, in degrees")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.repeat, args.latency, args.error_rate, args.seed, args.cell_size)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "latency_s": args.latency,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+        "cell_size": args.cell_size,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(
+        f"{'station':<16}{'size':>6}{'cells':>7}{'cold ms':>10}{'fetch ms':>10}{'xform ms':>10}"
+        f"{'warm us':>10}{'reqs':>6}{'KB':>9}{'refresh KB':>12}"
+    )
+    for row in results:
+        print(
+            f"{row['station']:<16}{row['points_per_side']:>6}{row['model_cells']:>7.0f}"
+            f"{row['cold_rerun_s'] * 1e3:>10.1f}{row['fetch_s'] * 1e3:>10.1f}"
+            f"{row['transform_s'] * 1e3:>10.2f}{row['warm_rerun_s'] * 1e6:>10.1f}"
+            f"{row['requests']:>6.0f}{row['bytes_received'] / 1024:>9.1f}{row['refresh_bytes_received'] / 1024:>12.1f}"
+        )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
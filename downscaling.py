@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+
+# Local elevation raster: a 2-D .npy array (north-up, row-major, metres) next to a .json geotransform
+# {"origin": [lon, lat] of the top-left corner, "pixel_size": [degrees east, degrees south], "nodata": ...}.
+# Downscaling is off unless DEM_PATH points at one.
+dem_path = os.environ.get("DEM_PATH", "")
+# Standard atmosphere cooling with height, in °C per metre
+lapse_rate = 0.0065
+# Precipitation falls as snow below snow_temperature, as rain above rain_temperature, mixed in between
+snow_temperature = 0.0
+rain_temperature = 2.0
+# Centimetres of fresh snow per millimetre of water, the ratio Open-Meteo uses for snowfall
+snow_ratio = 0.7
+# Orographic enhancement of precipitation per metre above the model cell, and its bounds
+precipitation_gradient = 0.0004
+precipitation_factor_bounds = (0.5, 2.0)
+# Hourly variables the downscaling needs on top of the displayed ones
+temperature_variable = "temperature_2m"
+
+
+def geotransform_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+# Write an elevation array and its geotransform in the layout ElevationRaster maps
+def save_raster(path, elevation, origin, pixel_size, nodata=None):
+    np.save(path, np.asarray(elevation, dtype="<f4"))
+    with open(geotransform_path(path), "w") as f:
+        json.dump({"origin": list(origin), "pixel_size": list(pixel_size), "nodata": nodata}, f)
+
+
+# Memory-mapped DEM. Only the pixels under the requested points are paged in, so rasters much larger
+# than RAM cost a few kilobytes per station.
+class ElevationRaster:
+    def __init__(self, path):
+        with open(geotransform_path(path)) as f:
+            geotransform = json.load(f)
+        self.data = np.load(path, mmap_mode="r")
+        # Identifies this DEM in snapshot headers, so replacing or moving it invalidates grids built with it
+        self.tag = f"{os.path.abspath(path)}@{os.stat(path).st_mtime_ns}"
+        self.origin_lon, self.origin_lat = geotransform["origin"]
+        self.pixel_width, self.pixel_height = geotransform["pixel_size"]
+        self.nodata = geotransform.get("nodata")
+
+    # Bilinear elevation of every point, read from the smallest window covering them; NaN off the
+    # raster or on nodata pixels
+    def sample(self, lats, lons):
+        cols = (np.asarray(lons) - self.origin_lon) / self.pixel_width - 0.5
+        rows = (self.origin_lat - np.asarray(lats)) / self.pixel_height - 0.5
+        height, width = self.data.shape
+        inside = (rows >= 0) & (rows <= height - 1) & (cols >= 0) & (cols <= width - 1)
+        elevation = np.full(rows.shape, np.nan)
+        if not inside.any():
+            return elevation
+        rows, cols = rows[inside], cols[inside]
+        row_start, col_start = int(rows.min()), int(cols.min())
+        row_stop = min(int(rows.max()) + 2, height)
+        col_stop = min(int(cols.max()) + 2, width)
+        window = np.array(self.data[row_start:row_stop, col_start:col_stop], dtype=float)
+        if self.nodata is not None:
+            window[window == self.nodata] = np.nan
+        r = rows - row_start
+        c = cols - col_start
+        r0 = np.minimum(r.astype(int), window.shape[0] - 1)
+        c0 = np.minimum(c.astype(int), window.shape[1] - 1)
+        r1 = np.minimum(r0 + 1, window.shape[0] - 1)
+        c1 = np.minimum(c0 + 1, window.shape[1] - 1)
+        dr = r - r0
+        dc = c - c0
+        top = window[r0, c0] * (1 - dc) + window[r0, c1] * dc
+        bottom = window[r1, c0] * (1 - dc) + window[r1, c1] * dc
+        elevation[inside] = top * (1 - dr) + bottom * dr
+        return elevation
+
+
+# Every grid point's hourly values from the series of its model cell, corrected for the height
+# difference between the point (from the DEM) and the cell (the grid-cell height Open-Meteo reports
+# when its own downscaling is off): temperature follows the lapse rate, precipitation gets the
+# orographic factor and is split again into snow and rain at the point's temperature.
+#   values: (cells, hours, variables) hourly amounts, in the order of variables
+#   temperature: (cells, hours), cell_elevation: (cells,)
+# Returns (points, hours, variables); points off the DEM keep their cell's values.
+def downscale(raster, lats, lons, point_cells, values, variables, temperature, cell_elevation):
+    point_values = values[point_cells]
+    base = cell_elevation[point_cells]
+    elevation = raster.sample(lats, lons)
+    dz = np.where(np.isnan(elevation) | np.isnan(base), 0.0, elevation - base)
+    adjusted = dz != 0
+    if not adjusted.any():
+        return point_values
+    point_temperature = temperature[point_cells] - lapse_rate * dz[:, None]
+    snow_fraction = np.clip(
+        (rain_temperature - point_temperature) / (rain_temperature - snow_temperature), 0.0, 1.0
+    )
+    factor = np.clip(1 + precipitation_gradient * dz, *precipitation_factor_bounds)[:, None]
+    precipitation = point_values[:, :, variables.index("precipitation")] * factor
+    downscaled = {
+        "precipitation": precipitation,
+        "snowfall": precipitation * snow_fraction * snow_ratio,
+        "rain": precipitation * (1 - snow_fraction),
+    }
+    for j, variable in enumerate(variables):
+        if variable in downscaled:
+            point_values[adjusted, :, j] = downscaled[variable][adjusted]
+    return point_values
+
+
+_default_raster = None
+_default_raster_loaded = False
+_default_raster_lock = threading.Lock()
+
+
+# Tag of the process-wide DEM, or None when grids are not downscaled
+def default_raster_tag():
+    raster = default_raster()
+    return raster.tag if raster is not None else None
+
+
+# Process-wide DEM, or None when DEM_PATH is unset or unreadable
+def default_raster():
+    global _default_raster, _default_raster_loaded
+    with _default_raster_lock:
+        if not _default_raster_loaded:
+            _default_raster_loaded = True
+            if dem_path:
+                try:
+                    _default_raster = ElevationRaster(dem_path)
+                except (OSError, ValueError, KeyError):
+                    _default_raster = None
+        return _default_raster
@@ -0,0 +1,198 @@
+"""Append-only archive of every fetched forecast run, for verification and storm replays.
+
+Each (station, model run) is one compressed columnar chunk (.npz with lats, lons, hours,
+point_cells and the cumulative cells x hours x types array). Chunks are named by content, so a run
+that left a station's data unchanged reuses the previous chunk. A sqlite index holds one row per
+(station, model run) with the valid-time window, so range queries only open the chunks they need.
+
+    python forecast_archive.py "Mont Sutton" --from 2025-01-01 --to 2025-02-01 --hours 48
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+archive_dir = os.environ.get("FORECAST_ARCHIVE_DIR", os.path.join("forecast_store", "archive"))
+index_name = "index.sqlite"
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    station TEXT NOT NULL,
+    model_run TEXT NOT NULL,
+    valid_start TEXT NOT NULL,
+    valid_end TEXT NOT NULL,
+    grid TEXT NOT NULL,
+    chunk TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    archived_at TEXT NOT NULL,
+    PRIMARY KEY (station, model_run)
+);
+CREATE INDEX IF NOT EXISTS runs_by_valid_time ON runs (station, valid_start, valid_end);
+"""
+
+
+def station_slug(station):
+    return re.sub(r"[^a-z0-9]+", "-", station.lower()).strip("-")
+
+
+# Archive rooted at one directory. Every method opens its own sqlite connection, so one archive can be
+# shared by the refresh threads and by other processes.
+class ForecastArchive:
+    def __init__(self, path=archive_dir):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def execute(self, query, args=()):
+        os.makedirs(self.path, exist_ok=True)
+        connection = sqlite3.connect(os.path.join(self.path, index_name), timeout=10)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                if not self.ready:
+                    connection.executescript(schema)
+                    self.ready = True
+                return [dict(row) for row in connection.execute(query, args)]
+        finally:
+            connection.close()
+
+    # One chunk write and one index insert per run; appending a run already archived does nothing.
+    # Returns the row as stored.
+    def append(self, station, grid, grid_definition, model_run):
+        import numpy as np
+
+        os.makedirs(os.path.join(self.path, station_slug(station)), exist_ok=True)
+        columns = {
+            "lats": np.asarray(grid.lats, dtype="<f8"),
+            "lons": np.asarray(grid.lons, dtype="<f8"),
+            "hours": np.asarray(grid.hours, dtype="<i4"),
+            "point_cells": np.asarray(grid.point_cells, dtype="<i4"),
+            "cumulative": np.asarray(grid.cumulative, dtype="<f4"),
+        }
+        digest = hashlib.blake2b(digest_size=12)
+        for name, column in columns.items():
+            digest.update(name.encode())
+            digest.update(np.ascontiguousarray(column).tobytes())
+        digest.update(str(grid.start).encode())
+        chunk = os.path.join(station_slug(station), f"{digest.hexdigest()}.npz")
+        chunk_path = os.path.join(self.path, chunk)
+        if not os.path.exists(chunk_path):
+            tmp_path = f"{chunk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, **columns)
+            os.replace(tmp_path, chunk_path)
+
+        start = datetime.fromisoformat(grid.start) if grid.start else datetime.fromisoformat(model_run)
+        row = {
+            "station": station,
+            "model_run": model_run,
+            "valid_start": start.isoformat(),
+            "valid_end": (start + timedelta(hours=int(grid.hours[-1]))).isoformat(),
+            "grid": ",".join(str(value) for value in grid_definition),
+            "chunk": chunk,
+            "points": len(grid.lats),
+            "archived_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self.lock:
+            self.execute(
+                "INSERT OR IGNORE INTO runs VALUES "
+                "(:station, :model_run, :valid_start, :valid_end, :grid, :chunk, :points, :archived_at)",
+                row,
+            )
+        return row
+
+    # Index rows of a station's runs whose valid window overlaps [valid_from, valid_to), oldest first.
+    # Only the index is read. Bounds are UTC ISO strings, which compare in time order.
+    def runs(self, station, valid_from=None, valid_to=None):
+        query = "SELECT * FROM runs WHERE station = ?"
+        args = [station]
+        if valid_from:
+            query += " AND valid_end >= ?"
+            args.append(valid_from)
+        if valid_to:
+            query += " AND valid_start < ?"
+            args.append(valid_to)
+        return self.execute(query + " ORDER BY model_run", args)
+
+    def load(self, row):
+        import numpy as np
+        from forecast_engine import StationGrid
+
+        with np.load(os.path.join(self.path, row["chunk"])) as chunk:
+            return StationGrid(
+                lats=chunk["lats"],
+                lons=chunk["lons"],
+                hours=chunk["hours"],
+                cumulative=chunk["cumulative"],
+                point_cells=chunk["point_cells"],
+                start=row["valid_start"],
+            )
+
+    # Every archived forecast of one lead time: (model run, valid time, per-point cumulative totals)
+    # for the runs whose forecast_hours lead falls in [valid_from, valid_to)
+    def horizon_series(self, station, data_type, forecast_hours, valid_from=None, valid_to=None):
+        lead = timedelta(hours=forecast_hours)
+        query = "SELECT * FROM runs WHERE station = ?"
+        args = [station]
+        if valid_from:
+            query += " AND valid_start >= ?"
+            args.append((datetime.fromisoformat(valid_from) - lead).isoformat())
+        if valid_to:
+            query += " AND valid_start < ?"
+            args.append((datetime.fromisoformat(valid_to) - lead).isoformat())
+        series = []
+        for row in self.execute(query + " ORDER BY valid_start, model_run", args):
+            valid_time = (datetime.fromisoformat(row["valid_start"]) + lead).isoformat()
+            series.append((row["model_run"], valid_time, self.load(row).at(data_type, forecast_hours)))
+        return series
+
+
+def utc_iso(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+
+# Process-wide archive, or None when FORECAST_ARCHIVE_DIR is set empty to turn archiving off
+def default_archive():
+    global _default_archive
+    with _default_archive_lock:
+        if _default_archive is None and archive_dir:
+            _default_archive = ForecastArchive()
+        return _default_archive
+
+
+def main():
+    from forecast_engine import data_types
+
+    parser = argparse.ArgumentParser(description="Query archived forecast runs")
+    parser.add_argument("station")
+    parser.add_argument("--from", dest="valid_from", help="Start of the valid-time range (ISO, UTC by default)")
+    parser.add_argument("--to", dest="valid_to", help="End of the valid-time range, exclusive")
+    parser.add_argument("--hours", type=int, default=48, help="Lead time of the forecasts to list")
+    parser.add_argument("--type", choices=data_types, default=data_types[0])
+    parser.add_argument("--archive", default=archive_dir)
+    args = parser.parse_args()
+
+    archive = ForecastArchive(args.archive)
+    valid_from = utc_iso(args.valid_from) if args.valid_from else None
+    valid_to = utc_iso(args.valid_to) if args.valid_to else None
+    series = archive.horizon_series(args.station, args.type, args.hours, valid_from, valid_to)
+    print(f"{'model run':<28}{'valid time':<28}{'mean':>8}{'max':>8}")
+    for model_run, valid_time, values in series:
+        mean = values.mean() if values.size else float("nan")
+        peak = values.max() if values.size else float("nan")
+        print(f"{model_run:<28}{valid_time:<28}{mean:>8.2f}{peak:>8.2f}")
+    print(f"{len(series)} forecasts")
+
+
+if __name__ == "__main__":
+    main()
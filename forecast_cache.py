@@ -0,0 +1,36 @@
+import threading
+from collections import OrderedDict
+
+
+# Process-wide station grids keyed by (station, grid, model run). A grid stored for a new model run
+# replaces the entries of older runs for the same station, and the LRU bound caps memory.
+class ForecastCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    # Grid of whatever model run is held for a station, to serve while a newer run is fetched
+    def latest(self, station, grid):
+        with self.lock:
+            for key in reversed(self.entries):
+                if key[:2] == (station, grid):
+                    return self.entries[key]
+        return None
+
+    def put(self, key, value):
+        station, grid, model_run = key
+        with self.lock:
+            for old_key in [k for k in self.entries if k[:2] == (station, grid) and k[2] != model_run]:
+                del self.entries[old_key]
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
@@ -0,0 +1,132 @@
+"""Compute station forecast grids without the Streamlit app.
+
+Refreshes the snapshot store for the latest upstream model run (stations that already have a snapshot of
+that run are left alone unless --force is given), and optionally exports every grid as JSON or as a
+columnar .npz file.
+
+    python forecast_cli.py                                   # cron: precompute snapshots
+    python forecast_cli.py --format json --output grids.json
+    python forecast_cli.py --stations Mont-Tremblant --format npz --output tremblant.npz
+
+Heavy modules (numpy, requests) are imported after argument parsing, so --help stays instant.
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+
+
+def grid_record(station, station_grid):
+    return {
+        "title": station.title,
+        "grid": list(station.grid),
+        "lats": station_grid.lats.tolist(),
+        "lons": station_grid.lons.tolist(),
+        "hours": station_grid.hours.tolist(),
+        "start": station_grid.start,
+        "point_cells": station_grid.point_cells.tolist(),
+        # Cumulative totals per model cell, hour and type, in data_types order
+        "cumulative": station_grid.cumulative.astype(float).round(3).tolist(),
+        "summary": station_grid.summary,
+    }
+
+
+def write_json(path, model_run, results, data_types):
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_run": model_run,
+        "data_types": data_types,
+        "stations": {station.name: grid_record(station, grid) for station, grid in results},
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, separators=(",", ":"))
+
+
+# One array per station and column, named "<station>.<column>", plus the metadata as a JSON string
+def write_npz(path, model_run, results, data_types):
+    import numpy as np
+
+    arrays = {
+        "meta": np.array(json.dumps({
+            "model_run": model_run,
+            "data_types": data_types,
+            "stations": {station.name: list(station.grid) for station, _ in results},
+            "starts": {station.name: grid.start for station, grid in results},
+        })),
+    }
+    for station, grid in results:
+        arrays[f"{station.name}.lats"] = grid.lats
+        arrays[f"{station.name}.lons"] = grid.lons
+        arrays[f"{station.name}.hours"] = grid.hours
+        arrays[f"{station.name}.point_cells"] = grid.point_cells
+        arrays[f"{station.name}.cumulative"] = np.asarray(grid.cumulative, dtype="<f4")
+    np.savez_compressed(path, **arrays)
+
+
+# Stations are refreshed on this thread rather than through the app's background fetches, so every
+# snapshot and archive write is done before the process exits
+def compute_station_grids(selected, model_run, force, persist=True):
+    from forecast_cache import ForecastCache
+    from forecast_service import admit_refreshes, cached_station_grid, refresh_station_grids
+
+    cache = ForecastCache()
+    if force:
+        return refresh_station_grids(selected, model_run, cache, persist=persist)
+    results = []
+    missing = []
+    for station in selected:
+        station_grid = cached_station_grid(station, model_run, cache)
+        if station_grid is None:
+            missing.append(station)
+        else:
+            results.append((station, station_grid))
+    admitted = admit_refreshes([], missing)
+    missing = [station for station in missing if station.name in admitted]
+    return results + refresh_station_grids(missing, model_run, cache, persist=persist)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute station forecast grids headlessly")
+    parser.add_argument("--stations", nargs="+", help="Station names from the registry (default: all)")
+    parser.add_argument("--model-run", help="ISO model run to tag snapshots with (default: latest upstream)")
+    parser.add_argument("--force", action="store_true", help="Fetch even when a snapshot of the run exists")
+    parser.add_argument("--format", choices=["json", "npz"], default="json")
+    parser.add_argument("--output", help="Export file; snapshots are always written to the store")
+    args = parser.parse_args()
+
+    from forecast_engine import data_types
+    from forecast_service import estimated_model_run, latest_model_run
+    from station_registry import stations
+
+    selected = stations
+    if args.stations:
+        by_name = {station.name: station for station in stations}
+        unknown = sorted(set(args.stations) - set(by_name))
+        if unknown:
+            parser.error(f"unknown stations: {', '.join(unknown)} (known: {', '.join(by_name)})")
+        selected = [by_name[name] for name in args.stations]
+    model_run = args.model_run or latest_model_run()
+    persist = model_run is not None
+    if not persist:
+        # Never tag snapshots with a guessed run: the grids are still computed and exported
+        model_run = estimated_model_run()
+        print("Model metadata unavailable, snapshots not written (pass --model-run to tag them)", file=sys.stderr)
+
+    results = compute_station_grids(selected, model_run, args.force, persist)
+    order = {station.name: i for i, station in enumerate(selected)}
+    results.sort(key=lambda result: order[result[0].name])
+    if args.output:
+        writer = write_npz if args.format == "npz" else write_json
+        writer(args.output, model_run, results, data_types)
+
+    points = {station.name: len(grid.lats) for station, grid in results}
+    for station in selected:
+        status = f"{points[station.name]} points" if station.name in points else "failed"
+        print(f"{station.name:<16}{status}")
+    if args.output:
+        print(f"Grids written to {args.output}")
+    return 0 if len(points) == len(selected) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
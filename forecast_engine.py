@@ -0,0 +1,418 @@
+import asyncio
+import queue
+import threading
+import numpy as np
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+from downscaling import default_raster, downscale, temperature_variable
+from metrics import span
+from model_grid import default_cell_index
+
+
+# Open-Meteo accepts comma-separated coordinate lists, so a whole station grid fits in one call
+max_locations_per_request = 100
+max_forecast_hours = 48
+# Series start at local midnight, so the 48h horizon needs up to three days; asking only for those
+# keeps each request the cheapest kind of call against the upstream quota
+forecast_days = max_forecast_hours // 24 + 1
+data_type_mapping = {
+    "Snowfall": "snowfall",
+    "Rainfall": "rain",
+    "Total Precipitation": "precipitation",
+}
+data_types = list(data_type_mapping)
+summary_hours = (24, 48)
+summary_percentiles = (50, 90)
+
+
+# One station grid: cumulative totals for every model cell, hour and forecast type in a single array.
+# Points falling in the same model cell share one row, and point_cells fans rows back out to points.
+# A grid is held once per process and shared by every session, so its arrays are read-only float32/int
+# buffers (or the snapshot mapping itself) and everything derived from it is computed once.
+@dataclass
+class StationGrid:
+    lats: np.ndarray  # (points,)
+    lons: np.ndarray  # (points,)
+    hours: np.ndarray  # (hours,) forecast hour offsets, 0 to max_forecast_hours
+    cumulative: np.ndarray  # (cells, hours, types), types ordered as data_types
+    point_cells: np.ndarray  # (points,) row of cumulative serving each point
+    start: str = None  # UTC ISO time of forecast hour 0
+    dem: str = None  # tag of the DEM the points were downscaled against, None when they weren't
+    memo: dict = field(default_factory=dict, repr=False, compare=False)  # derived payloads, see memoized
+
+    def __post_init__(self):
+        self.cumulative = np.asarray(self.cumulative, dtype=np.float32)
+        for array in (self.lats, self.lons, self.hours, self.cumulative, self.point_cells):
+            array.flags.writeable = False
+
+    # Value derived from this grid, computed by the first session that asks for it and shared with
+    # the others; it lives as long as the grid. Callers must not modify what they get back.
+    def memoized(self, key, compute):
+        value = self.memo.get(key)
+        if value is None:
+            value = self.memo[key] = compute()
+        return value
+
+    # Cumulative series of every model cell
+    def column(self, data_type):
+        return self.cumulative[:, :, data_types.index(data_type)]
+
+    # Cumulative series of every point up to and including the requested forecast hour
+    def up_to(self, data_type, forecast_hours):
+        stop = np.searchsorted(self.hours, forecast_hours, side="right")
+        return self.column(data_type)[self.point_cells, :stop]
+
+    # Cumulative total of every point at the requested forecast hour
+    def at(self, data_type, forecast_hours):
+        stop = np.searchsorted(self.hours, forecast_hours, side="right")
+        return self.column(data_type)[:, max(stop - 1, 0)][self.point_cells]
+
+    # Computed once per grid, so it lives as long as the cached snapshot and costs nothing per rerun
+    @cached_property
+    def summary(self):
+        return summarize_grid(self)
+
+
+# Fold a freshly fetched grid into the one it replaces. Identical data keeps the previous grid, with
+# its computed summary, so nothing derived is rebuilt; on the same layout only the data array is new.
+# Returns (grid, changed).
+def carry_forward(previous, station_grid):
+    if previous is None or not (
+        np.array_equal(previous.lats, station_grid.lats)
+        and np.array_equal(previous.lons, station_grid.lons)
+        and np.array_equal(previous.hours, station_grid.hours)
+        and np.array_equal(previous.point_cells, station_grid.point_cells)
+        and previous.start == station_grid.start
+        and previous.dem == station_grid.dem
+    ):
+        return station_grid, True
+    if np.array_equal(previous.cumulative, station_grid.cumulative):
+        return previous, False
+    return StationGrid(
+        lats=previous.lats,
+        lons=previous.lons,
+        hours=previous.hours,
+        cumulative=station_grid.cumulative,
+        point_cells=previous.point_cells,
+        start=previous.start,
+        dem=previous.dem,
+    ), True
+
+
+# Requests for a set of station grids, deduplicated down to one point per known model cell
+@dataclass
+class FetchPlan:
+    coords_by_grid: list
+    request_coords: list
+    sources: list  # for every grid point, in grid order, the index of the requested point serving it
+    chunks: list
+
+
+def generate_coordinates(lat_min, lat_max, lon_min, lon_max, num_points):
+    lats = np.linspace(lat_min, lat_max, num_points)
+    lons = np.linspace(lon_min, lon_max, num_points)
+    return [{"lat": lat, "lon": lon} for lat in lats for lon in lons]
+
+
+# Points of a complete station grid: a (lat_min, lat_max, lon_min, lon_max, num_points) grid is
+# num_points x num_points
+def grid_points(grid):
+    return grid[4] ** 2
+
+
+# Query parameters fetching the hourly series of several coordinates in a single request.
+# Snowfall, rain and precipitation all come back in the same call. With a DEM to downscale against,
+# temperature comes too, and Open-Meteo's own downscaling is turned off (elevation=nan) so the series
+# and elevation are those of the model cell.
+def batch_params(coords):
+    variables = list(data_type_mapping.values())
+    params = {
+        "latitude": ",".join(str(round(coord["lat"], 5)) for coord in coords),
+        "longitude": ",".join(str(round(coord["lon"], 5)) for coord in coords),
+        "forecast_days": forecast_days,
+        "timezone": "auto",
+    }
+    if default_raster() is not None:
+        variables.append(temperature_variable)
+        params["elevation"] = ",".join("nan" for _ in coords)
+    params["hourly"] = ",".join(variables)
+    return params
+
+
+# Split a batch response back into per-point locations (None for every point of a failed batch).
+# Takes a decoded JSON body or the location list of OpenMeteoClient.get_locations.
+def split_locations(data, num_coords):
+    if data is None:
+        return [None] * num_coords
+    # A single location comes back as an object, several locations as a list in request order
+    return data if isinstance(data, list) else [data]
+
+
+def has_series(location):
+    return bool(location) and ("hourly_start" in location or bool(location.get("hourly", {}).get("time")))
+
+
+# Hourly values of one variable as floats (None, from JSON, becomes NaN), or None when absent
+def hourly_series(location, variable, num_hours):
+    series = location["hourly"].get(variable)
+    if series is None:
+        return None
+    return np.asarray(series[:num_hours], dtype=float)
+
+
+# First timestamp of a location's series as UTC ISO: given as a Unix time by the binary format,
+# as a local time string by JSON
+def series_start(location):
+    if "hourly_start" in location:
+        return datetime.fromtimestamp(location["hourly_start"], timezone.utc).isoformat()
+    local = datetime.fromisoformat(location["hourly"]["time"][0])
+    utc = local - timedelta(seconds=location.get("utc_offset_seconds", 0))
+    return utc.replace(tzinfo=timezone.utc).isoformat()
+
+
+# Cell temperatures and heights for downscaling, or None when a cell lacks them
+def cell_conditions(cell_locations, num_hours):
+    temperature = np.full((len(cell_locations), num_hours), np.nan)
+    elevation = np.full(len(cell_locations), np.nan)
+    for row, location in enumerate(cell_locations):
+        series = hourly_series(location, temperature_variable, num_hours)
+        if series is None or not len(series) or location.get("elevation") is None:
+            return None
+        temperature[row, :len(series)] = series
+        elevation[row] = location["elevation"]
+    return temperature, elevation
+
+
+# Pack the per-point hourly series into one (cells x hours x types) array and accumulate along time.
+# Locations served from the same model cell (same echoed latitude/longitude) are stored once. With a
+# DEM configured, every point is downscaled from its cell instead and gets its own row.
+def build_station_grid(coords, locations, forecast_hours=max_forecast_hours):
+    num_hours = forecast_hours + 1
+    kept = [i for i, location in enumerate(locations) if has_series(location)]
+    cell_rows = {}
+    point_cells = []
+    for i in kept:
+        location = locations[i]
+        cell = (location.get("latitude", coords[i]["lat"]), location.get("longitude", coords[i]["lon"]))
+        if cell not in cell_rows:
+            cell_rows[cell] = (len(cell_rows), location)
+        point_cells.append(cell_rows[cell][0])
+    point_cells = np.array(point_cells, dtype=np.int32)
+    lats = np.array([coords[i]["lat"] for i in kept])
+    lons = np.array([coords[i]["lon"] for i in kept])
+    values = np.zeros((len(cell_rows), num_hours, len(data_types)))
+    for row, location in cell_rows.values():
+        for j, api_param in enumerate(data_type_mapping.values()):
+            series = hourly_series(location, api_param, num_hours)
+            if series is not None:
+                values[row, :len(series), j] = series
+    raster = default_raster()
+    conditions = cell_conditions([location for _, location in cell_rows.values()], num_hours) if raster else None
+    dem = None
+    if kept and conditions is not None:
+        with span("downscale"):
+            values = downscale(raster, lats, lons, point_cells, values, list(data_type_mapping.values()), *conditions)
+        point_cells = np.arange(len(kept), dtype=np.int32)
+        dem = raster.tag
+    return StationGrid(
+        lats=lats,
+        lons=lons,
+        hours=np.arange(num_hours),
+        cumulative=np.nancumsum(values, axis=1),
+        point_cells=point_cells,
+        start=series_start(locations[kept[0]]) if kept else None,
+        dem=dem,
+    )
+
+
+def chunk_coordinates(coords):
+    return [coords[i:i + max_locations_per_request] for i in range(0, len(coords), max_locations_per_request)]
+
+
+def plan_station_grids(grids, cell_index=None):
+    cell_index = cell_index or default_cell_index()
+    coords_by_grid = [generate_coordinates(*grid) for grid in grids]
+    coords = [coord for grid_coords in coords_by_grid for coord in grid_coords]
+    request_coords, sources = cell_index.plan(coords)
+    return FetchPlan(coords_by_grid, request_coords, sources, chunk_coordinates(request_coords))
+
+
+# Locations upstream would be asked for, once points sharing a known model cell are deduplicated
+def request_locations(grid, cell_index=None):
+    return len(plan_station_grids([grid], cell_index).request_coords)
+
+
+def assemble_station_grids(plan, responses, cell_index=None):
+    cell_index = cell_index or default_cell_index()
+    locations = [
+        location for chunk, data in zip(plan.chunks, responses) for location in split_locations(data, len(chunk))
+    ]
+    cell_index.learn(plan.request_coords, locations)
+    station_grids = []
+    offset = 0
+    for grid_coords in plan.coords_by_grid:
+        grid_sources = plan.sources[offset:offset + len(grid_coords)]
+        station_grids.append(build_station_grid(grid_coords, [locations[source] for source in grid_sources]))
+        offset += len(grid_coords)
+    return station_grids
+
+
+# One pipeline for any number of stations: the points of every grid are deduplicated by model cell,
+# packed together into shared requests and fetched concurrently. Yields (grid index, StationGrid) as
+# soon as every request a grid depends on has completed, in completion order rather than grid order.
+async def iter_station_grids_async(grids, client=None, cell_index=None):
+    if client is None:
+        # Imported on first fetch, so code that only reads snapshots never loads the HTTP stack
+        from open_meteo_client import default_client
+
+        client = default_client()
+    cell_index = cell_index or default_cell_index()
+    plan = plan_station_grids(grids, cell_index)
+    grid_sources = []
+    offset = 0
+    for grid_coords in plan.coords_by_grid:
+        grid_sources.append(plan.sources[offset:offset + len(grid_coords)])
+        offset += len(grid_coords)
+    grids_by_chunk = [[] for _ in plan.chunks]
+    pending = []
+    for g, sources in enumerate(grid_sources):
+        chunks = {source // max_locations_per_request for source in sources}
+        for c in chunks:
+            grids_by_chunk[c].append(g)
+        pending.append(len(chunks))
+        if not chunks:
+            yield g, build_station_grid(plan.coords_by_grid[g], [])
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + client.deadline
+    semaphore = asyncio.Semaphore(client.max_concurrency)
+    tasks = {
+        asyncio.ensure_future(client.get_locations(batch_params(chunk), semaphore)): c
+        for c, chunk in enumerate(plan.chunks)
+    }
+    locations = [None] * len(plan.request_coords)
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(
+                tasks, timeout=max(deadline - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise TimeoutError(f"Forecast fetch exceeded its {client.deadline}s deadline")
+            for task in done:
+                c = tasks.pop(task)
+                start = c * max_locations_per_request
+                with span("split"):
+                    chunk_locations = split_locations(task.result(), len(plan.chunks[c]))[:len(plan.chunks[c])]
+                    for i, location in enumerate(chunk_locations):
+                        locations[start + i] = location
+                    cell_index.learn(plan.chunks[c], chunk_locations)
+                for g in grids_by_chunk[c]:
+                    pending[g] -= 1
+                    if pending[g] == 0:
+                        grid_locations = [locations[source] for source in grid_sources[g]]
+                        with span("transform"):
+                            station_grid = build_station_grid(plan.coords_by_grid[g], grid_locations)
+                        yield g, station_grid
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# Blocking iterator over iter_station_grids_async, for the Streamlit script: the event loop runs on a
+# background thread and each grid is handed over as soon as it is ready
+def iter_station_grids(grids, client=None, cell_index=None):
+    results = queue.Queue()
+    finished = object()
+
+    async def produce():
+        async for item in iter_station_grids_async(grids, client, cell_index):
+            results.put(item)
+
+    def run():
+        try:
+            asyncio.run(produce())
+        except Exception as error:
+            results.put(error)
+        finally:
+            results.put(finished)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = results.get()
+        if item is finished:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def fetch_station_grids_async(grids, client=None, cell_index=None):
+    station_grids = [None] * len(grids)
+    async for g, station_grid in iter_station_grids_async(grids, client, cell_index):
+        station_grids[g] = station_grid
+    return station_grids
+
+
+def fetch_station_grids(grids, client=None, cell_index=None):
+    return asyncio.run(fetch_station_grids_async(grids, client, cell_index))
+
+
+async def fetch_station_grid_async(lat_min, lat_max, lon_min, lon_max, num_points, client=None):
+    grids = await fetch_station_grids_async([(lat_min, lat_max, lon_min, lon_max, num_points)], client)
+    return grids[0]
+
+
+def fetch_station_grid(lat_min, lat_max, lon_min, lon_max, num_points, client=None):
+    return asyncio.run(fetch_station_grid_async(lat_min, lat_max, lon_min, lon_max, num_points, client))
+
+
+# Cumulative total of every point at the requested forecast hour, and the same normalized to the peak
+def horizon_weights(grid, data_type, forecast_hours):
+    values = grid.at(data_type, forecast_hours)
+    peak = values.max() if values.size else 0.0
+    weights = values / peak if peak > 0 else np.zeros_like(values)
+    return values, weights
+
+
+# Mean, max and percentiles over every point of the cumulative totals at the summary hours, for every
+# forecast type, in one reduction: {data_type: {hour: {"mean": ..., "max": ..., "p50": ..., "p90": ...}}}
+def summarize_grid(grid, hours=summary_hours, percentiles=summary_percentiles):
+    stops = np.maximum(np.searchsorted(grid.hours, hours, side="right") - 1, 0)
+    values = grid.cumulative[:, stops, :][grid.point_cells].astype(float)
+    if not len(values):
+        return {}
+    stats = {"mean": values.mean(axis=0), "max": values.max(axis=0)}
+    for percentile, stat in zip(percentiles, np.percentile(values, percentiles, axis=0)):
+        stats[f"p{percentile}"] = stat
+    return {
+        data_type: {
+            hour: {name: float(stat[h, t]) for name, stat in stats.items()} for h, hour in enumerate(hours)
+        }
+        for t, data_type in enumerate(data_types)
+    }
+
+
+# Normalized weights of every point at each requested forecast hour, stacked as (horizons x points)
+def timeline_weights(grid, data_type, horizons):
+    stops = np.maximum(np.searchsorted(grid.hours, horizons, side="right") - 1, 0)
+    values = grid.column(data_type)[:, stops][grid.point_cells].T
+    peaks = np.max(values, axis=1, keepdims=True, initial=0.0)
+    return np.divide(values, peaks, out=np.zeros_like(values), where=peaks > 0)
+
+
+# Heatmap layer rows: only the final cumulative value per point, with short keys and rounded numbers
+# (about 1 m of position, 0.1% of weight) since every row is serialized to JSON for the browser.
+# Zero-weight points add nothing to a heatmap and are left out.
+# Built once per grid, type and hour, then shared by every session.
+def heatmap_points(grid, data_type, forecast_hours):
+    def compute():
+        _, weights = horizon_weights(grid, data_type, forecast_hours)
+        keep = weights > 0
+        lons = np.round(grid.lons[keep], 5).tolist()
+        lats = np.round(grid.lats[keep], 5).tolist()
+        # Rounded in float64: float32 values print with up to 17 digits once they are Python floats
+        rounded = np.round(weights[keep].astype(float), 3).tolist()
+        return [{"p": [lon, lat], "w": weight} for lon, lat, weight in zip(lons, lats, rounded)]
+
+    return grid.memoized(("heatmap", data_type, forecast_hours), compute)
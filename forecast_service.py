@@ -0,0 +1,321 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta, timezone
+
+from downscaling import default_raster_tag
+from forecast_archive import default_archive
+from forecast_cache import ForecastCache
+from forecast_engine import (
+    carry_forward,
+    data_types,
+    forecast_days,
+    grid_points,
+    iter_station_grids,
+    request_locations,
+)
+from forecast_store import load_snapshot, save_snapshot, stored_model_runs
+from metrics import inc, observe, span
+from single_flight import SingleFlight
+from upstream_quota import call_cost, default_quota
+
+
+# The weather models behind Open-Meteo publish a new run every 6 hours (00/06/12/18 UTC),
+# which becomes available a few hours after initialisation
+model_update_hours = 6
+model_availability_delay_hours = 4
+# Models whose latest run defines the forecast version; "best match" blends them over Quebec
+upstream_models = os.environ.get("OPEN_METEO_MODELS", "cmc_gem_hrdps,cmc_gem_gdps,ncep_gfs013").split(",")
+# How often the model metadata is checked; between checks every rerun reuses the last answer
+model_check_seconds = int(os.environ.get("OPEN_METEO_MODEL_CHECK_SECONDS", "300"))
+# How long a cold process waits for the first metadata answer before keying on a provisional run
+model_check_wait = float(os.environ.get("OPEN_METEO_MODEL_CHECK_WAIT", "2"))
+model_run_state = {"run": None, "checked": -math.inf, "provisional": None, "answered": threading.Event()}
+model_run_lock = threading.Lock()
+# Fetches in progress in this process, keyed like the cache: (station, grid, model run)
+in_flight = SingleFlight()
+# Popularity and freshness of each station in this process, to rank refreshes when the quota is tight
+station_views = Counter()
+last_refreshed = {}
+refresh_stats_lock = threading.Lock()
+
+
+# Latest model run expected to be served upstream, estimated from the model schedule alone
+def estimated_model_run(now=None):
+    now = now or datetime.now(timezone.utc)
+    available = now - timedelta(hours=model_availability_delay_hours)
+    run_hour = available.hour - available.hour % model_update_hours
+    return available.replace(hour=run_hour, minute=0, second=0, microsecond=0).isoformat()
+
+
+# Latest run published upstream, from the model metadata: the newest initialisation across
+# upstream_models, or None when no metadata could be read
+def latest_model_run(client=None):
+    if client is None:
+        from open_meteo_client import default_client
+
+        client = default_client()
+    runs = [run for run in (client.get_model_run(model) for model in upstream_models) if run is not None]
+    if not runs:
+        return None
+    return datetime.fromtimestamp(max(runs), timezone.utc).isoformat()
+
+
+def check_model_run():
+    try:
+        run = latest_model_run()
+        with model_run_lock:
+            if run is not None and run != model_run_state["run"]:
+                if model_run_state["run"] is not None:
+                    inc("model_run_changes_total")
+                model_run_state["run"] = run
+    finally:
+        model_run_state["answered"].set()
+
+
+# Stand-in key while the metadata is unknown: the newest run already in the snapshot store, so a cold
+# process serves the snapshots a previous process or the CLI wrote, until the schedule estimate moves
+# past it. The store is scanned once per process; the estimate is taken on every call.
+def provisional_model_run():
+    with model_run_lock:
+        if model_run_state["provisional"] is None:
+            model_run_state["provisional"] = max(stored_model_runs(), default="")
+        return max(model_run_state["provisional"], estimated_model_run())
+
+
+# Model run that cached forecasts are keyed by. Grids are only refetched when this changes, so while
+# upstream hasn't published a new run nothing is downloaded. The metadata is checked on a background
+# thread at most every model_check_seconds; a cold process waits up to model_check_wait for the first
+# answer, then falls back to provisional_model_run until the metadata is known.
+def current_model_run():
+    now = time.monotonic()
+    with model_run_lock:
+        run = model_run_state["run"]
+        due = now - model_run_state["checked"] >= model_check_seconds
+        if due:
+            model_run_state["checked"] = now
+    if due:
+        threading.Thread(target=check_model_run, daemon=True).start()
+    if run is None and model_run_state["answered"].wait(model_check_wait):
+        with model_run_lock:
+            run = model_run_state["run"]
+    return run or provisional_model_run()
+
+
+# Whether run comes from the upstream metadata rather than a stand-in. Grids fetched under a
+# stand-in are only kept in memory, so no snapshot or archived run ever carries a guessed tag.
+def model_run_confirmed(run):
+    with model_run_lock:
+        return run is not None and run == model_run_state["run"]
+
+
+# Whether a snapshot holds this station grid, and is current for model_run when one is given. A snapshot
+# built with another DEM, or without one, is only good as a stale fallback.
+def snapshot_matches(snapshot, grid, model_run=None):
+    if snapshot is None or snapshot[1]["grid"] != list(grid):
+        return False
+    if model_run is None:
+        return True
+    return snapshot[1]["model_run"] == model_run and snapshot[1].get("dem") == default_raster_tag()
+
+
+# Memory first, then a snapshot of the same run on disk, so restarts and new workers render immediately
+def cached_station_grid(station, model_run, cache):
+    key = (station.name, station.grid, model_run)
+    station_grid = cache.get(key)
+    if station_grid is not None:
+        inc("cache_hits_total", tier="memory")
+        return station_grid
+    with span("snapshot_load", station=station.name):
+        snapshot = load_snapshot(station.name)
+    if snapshot_matches(snapshot, station.grid, model_run):
+        inc("cache_hits_total", tier="snapshot")
+        station_grid = snapshot[0]
+        cache.put(key, station_grid)
+    else:
+        inc("cache_misses_total")
+    return station_grid
+
+
+# Snapshot the grid under model_run and cache it. With reload, the cached grid is the read-only
+# mapping of the new snapshot; without, the grid passed in is kept, with whatever it has computed.
+def store_station_grid(station, station_grid, model_run, cache, reload=True):
+    try:
+        with span("snapshot_save", station=station.name):
+            save_snapshot(station.name, station_grid, station.grid, model_run)
+    except OSError:
+        pass  # Serve from memory when the store isn't writable
+    snapshot = load_snapshot(station.name) if reload else None
+    if snapshot_matches(snapshot, station.grid, model_run):
+        station_grid = snapshot[0]
+    cache.put((station.name, station.grid, model_run), station_grid)
+    return station_grid
+
+
+def flight_key(station, model_run):
+    return (station.name, station.grid, model_run)
+
+
+# Keep every fetched run for later verification; archiving never breaks a refresh
+def archive_station_grid(station, station_grid, model_run):
+    archive = default_archive()
+    if archive is None:
+        return
+    try:
+        with span("archive", station=station.name):
+            archive.append(station.name, station_grid, station.grid, model_run)
+    except (OSError, sqlite3.Error):
+        inc("archive_errors_total")
+
+
+# Fetch the stations through one batched pipeline, storing each grid and resolving its flight as soon
+# as it is ready, then archiving it. Flights left over by a timeout or an upstream failure resolve to
+# None. A grid missing the points of a failed or rejected request counts as a failed refresh too: it is
+# neither cached, snapshotted nor archived, so readers keep the previous run and the next rerun retries.
+# Without persist, grids only go to the memory cache. owned maps the flight keys this call resolves to
+# their futures; by default it joins flights for the stations itself.
+# Returns the (station, grid) pairs that were refreshed.
+def refresh_station_grids(stations, model_run, cache, flights=in_flight, persist=True, owned=None):
+    if owned is None:
+        futures, keys = flights.join([flight_key(station, model_run) for station in stations])
+        owned = {key: futures[key] for key in keys}
+
+    def resolve(station, station_grid):
+        key = flight_key(station, model_run)
+        if key in owned:
+            flights.resolve(key, station_grid, owned.pop(key))
+
+    started = time.perf_counter()
+    refreshed = []
+    try:
+        for index, station_grid in iter_station_grids([station.grid for station in stations]):
+            station = stations[index]
+            # Time until this station's data is ready, upstream latency included
+            observe("fetch", time.perf_counter() - started, station=station.name)
+            if len(station_grid.lats) < grid_points(station.grid):
+                inc("incomplete_grids_total", station=station.name)
+                resolve(station, None)
+                continue
+            # A run that left this station's data as it was rebuilds nothing
+            previous = cache.latest(station.name, station.grid)
+            station_grid, changed = carry_forward(previous, station_grid)
+            inc("grid_refreshes_total", changed=changed)
+            if persist:
+                station_grid = store_station_grid(station, station_grid, model_run, cache, reload=changed)
+            else:
+                cache.put(flight_key(station, model_run), station_grid)
+            with refresh_stats_lock:
+                last_refreshed[station.name] = time.monotonic()
+            resolve(station, station_grid)
+            if persist:
+                archive_station_grid(station, station_grid, model_run)
+            refreshed.append((station, station_grid))
+    except TimeoutError:
+        pass
+    finally:
+        for key, future in owned.items():
+            flights.resolve(key, None, future)
+    return refreshed
+
+
+# Join the fetch already in flight for each station, starting one on a background thread for the
+# stations nobody is fetching yet. The fetch outlives the caller's rerun, so waiters are never orphaned.
+def request_station_grids(stations, model_run, cache, flights=in_flight, persist=True):
+    futures, owned = flights.join([flight_key(station, model_run) for station in stations])
+    inc("single_flight_joins_total", len(stations) - len(owned))
+    owned_stations = [station for station in stations if flight_key(station, model_run) in owned]
+    if owned_stations:
+        threading.Thread(
+            target=refresh_station_grids,
+            args=(owned_stations, model_run, cache, flights, persist, {key: futures[key] for key in owned}),
+            daemon=True,
+        ).start()
+    return {futures[flight_key(station, model_run)]: station for station in stations}
+
+
+# Lower sorts first: stations with nothing to show, then the stalest and most viewed ones
+def refresh_priority(station, essential):
+    with refresh_stats_lock:
+        refreshed = last_refreshed.get(station.name)
+        views = station_views[station.name]
+    age = math.inf if refreshed is None else time.monotonic() - refreshed
+    return (not essential, -age * (1 + views), -views)
+
+
+# Stations worth spending quota on. Those without any grid to fall back on are essential and may dip
+# into the reserve; stations that already show a stale grid keep it when the budget can't cover them.
+def admit_refreshes(stale, missing, quota=None):
+    quota = quota or default_quota()
+    candidates = [
+        (
+            refresh_priority(station, essential),
+            call_cost(request_locations(station.grid), len(data_types), forecast_days),
+            station.name,
+        )
+        for stations, essential in ((missing, True), (stale, False))
+        for station in stations
+    ]
+    essential = {station.name for station in missing}
+    return set(quota.admit(candidates, essential=lambda name: name in essential))
+
+
+# Grid of an older model run, from memory or from the last snapshot on disk
+def stale_station_grid(station, cache):
+    station_grid = cache.latest(station.name, station.grid)
+    if station_grid is None:
+        snapshot = load_snapshot(station.name)
+        if snapshot_matches(snapshot, station.grid):
+            station_grid = snapshot[0]
+            # Cached under its run only when it is that run's current grid, DEM included
+            if snapshot_matches(snapshot, station.grid, snapshot[1]["model_run"]):
+                cache.put((station.name, station.grid, snapshot[1]["model_run"]), station_grid)
+    return station_grid
+
+
+# Yields (station, grid) for cached stations first, then for the others as their fetch completes.
+# With serve_stale, a station holding a grid of an older run gets it right away while the new run is
+# fetched in the background (stale-while-revalidate); only stations with no data at all are waited on.
+# Concurrent sessions share a single upstream fetch per station and model run, and the upstream quota
+# decides which refreshes go out (see admit_refreshes). Without persist, fetched grids are not
+# snapshotted or archived (see model_run_confirmed).
+def stream_station_forecasts(stations, model_run, cache=None, serve_stale=True, quota=None, persist=True):
+    cache = cache if cache is not None else ForecastCache()
+    missing = []
+    stale = []
+    with refresh_stats_lock:
+        station_views.update(station.name for station in stations)
+    for station in stations:
+        station_grid = cached_station_grid(station, model_run, cache)
+        if station_grid is None and serve_stale:
+            station_grid = stale_station_grid(station, cache)
+            if station_grid is not None:
+                stale.append(station)
+                inc("stale_served_total")
+        if station_grid is None:
+            missing.append(station)
+        else:
+            yield station, station_grid
+    if not stale and not missing:
+        return
+    admitted = admit_refreshes(stale, missing, quota)
+    stale = [station for station in stale if station.name in admitted]
+    missing = [station for station in missing if station.name in admitted]
+    if stale:
+        request_station_grids(stale, model_run, cache, persist=persist)
+    if not missing:
+        return
+    waiting = request_station_grids(missing, model_run, cache, persist=persist)
+    for future in as_completed(waiting):
+        station_grid = future.result()
+        if station_grid is not None:
+            yield waiting[future], station_grid
+
+
+# Last good snapshot, whatever its model run, while upstream is unavailable
+def fallback_station_grid(station):
+    snapshot = load_snapshot(station.name)
+    return snapshot[0] if snapshot_matches(snapshot, station.grid) else None
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import struct
+import threading
+import weakref
+from datetime import datetime, timezone
+
+import numpy as np
+from forecast_engine import StationGrid, data_types
+from metrics import set_gauge
+
+
+store_dir = os.environ.get("FORECAST_STORE_DIR", "forecast_store")
+# Snapshot layout: 8-byte little-endian header length, JSON metadata header padded so the data
+# starts on a 64-byte boundary, then the (cells x hours x types) float32 array in C order
+header_length_format = "<Q"
+data_alignment = 64
+# Per-point header fields, already held by the grid itself
+grid_fields = ("lats", "lons", "hours", "point_cells")
+
+# Snapshots mapped in this process, by file identity, for as long as some session or cache holds the
+# grid: every caller gets the same mapping and arrays instead of its own copy, and a snapshot replaced
+# on disk is unmapped once the last reader lets go of it
+_mapped = weakref.WeakValueDictionary()
+_mapped_headers = {}
+_mapped_lock = threading.RLock()  # reentrant: a grid may be collected while the lock is held
+
+
+def snapshot_path(station):
+    slug = re.sub(r"[^a-z0-9]+", "-", station.lower()).strip("-")
+    return os.path.join(store_dir, f"{slug}.grid")
+
+
+# Write a station grid atomically, so readers always map either the previous or the new snapshot
+def save_snapshot(station, grid, grid_definition, model_run):
+    path = snapshot_path(station)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cumulative = np.ascontiguousarray(grid.cumulative, dtype="<f4")
+    header = {
+        "station": station,
+        "model_run": model_run,
+        "grid": list(grid_definition),
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+        "data_types": data_types,
+        "shape": list(cumulative.shape),
+        "lats": [float(lat) for lat in grid.lats],
+        "lons": [float(lon) for lon in grid.lons],
+        "hours": [int(hour) for hour in grid.hours],
+        "point_cells": [int(cell) for cell in grid.point_cells],
+        "start": grid.start,
+        "dem": grid.dem,
+    }
+    header_bytes = json.dumps(header).encode()
+    prefix_length = struct.calcsize(header_length_format)
+    padding = -(prefix_length + len(header_bytes)) % data_alignment
+    header_bytes += b" " * padding
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack(header_length_format, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(cumulative.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_file_header(f):
+    prefix = f.read(struct.calcsize(header_length_format))
+    (header_length,) = struct.unpack(header_length_format, prefix)
+    return json.loads(f.read(header_length)), len(prefix) + header_length
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return read_file_header(f)
+
+
+def release_snapshot(key):
+    with _mapped_lock:
+        if key not in _mapped:
+            _mapped_headers.pop(key, None)
+        set_gauge("snapshots_mapped", len(_mapped_headers))
+
+
+# Model run of every readable snapshot in the store, from the headers alone
+def stored_model_runs():
+    try:
+        names = os.listdir(store_dir)
+    except OSError:
+        return []
+    runs = []
+    for name in names:
+        if not name.endswith(".grid"):
+            continue
+        try:
+            runs.append(read_header(os.path.join(store_dir, name))[0]["model_run"])
+        except (OSError, ValueError, KeyError, struct.error):
+            continue
+    return runs
+
+
+# Map a station snapshot read-only. Returns (grid, header), or None when there is no usable snapshot.
+# The header is read from the same open file as the data, so a concurrent save can't mix two runs.
+# Worker processes mapping the same file share its pages through the OS page cache, and callers in
+# one process share the grid itself. The header returned leaves out the per-point fields.
+def load_snapshot(station):
+    path = snapshot_path(station)
+    try:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            with _mapped_lock:
+                grid = _mapped.get(key)
+                if grid is not None:
+                    return grid, _mapped_headers[key]
+            header, offset = read_file_header(f)
+            if header.get("data_types") != data_types or "point_cells" not in header:
+                return None
+            cumulative = np.memmap(f, dtype="<f4", mode="r", offset=offset, shape=tuple(header["shape"]))
+    except (OSError, ValueError, struct.error):
+        return None
+    grid = StationGrid(
+        lats=np.array(header["lats"]),
+        lons=np.array(header["lons"]),
+        hours=np.array(header["hours"]),
+        cumulative=cumulative,
+        point_cells=np.array(header["point_cells"], dtype=np.int32),
+        start=header.get("start"),
+        dem=header.get("dem"),
+    )
+    header = {name: value for name, value in header.items() if name not in grid_fields}
+    with _mapped_lock:
+        # Another thread may have mapped the same file meanwhile; keep the first mapping
+        shared = _mapped.get(key)
+        if shared is not None:
+            return shared, _mapped_headers[key]
+        _mapped[key] = grid
+        _mapped_headers[key] = header
+        set_gauge("snapshots_mapped", len(_mapped_headers))
+    weakref.finalize(grid, release_snapshot, key)
+    return grid, header
@@ -0,0 +1,319 @@
+"""Multi-session load test of one Streamlit worker against the offline Open-Meteo stand-in.
+
+Starts main_app.py under `streamlit run` as a single worker process and drives N concurrent sessions
+against it over its websocket, sending the same messages a browser does: a full page load, then
+slider moves and forecast type switches as fragment reruns, with exponential think times. Every
+session shares the worker's caches, in-flight fetches and snapshot mappings, as real users do.
+Reports p50/p95/p99 rerun latency, throughput, upstream calls, and the worker's resident memory with
+N sessions connected, against the same worker after a warm-up session.
+
+    python load_test.py --sessions 1 5 10 20 --interactions 20 --think 0.5 --latency 0.05
+
+Every run starts from an empty snapshot store: the warm-up session pays the upstream fetch, and the
+steps measure a warm worker. A rerun that fails, reports an exception or times out counts as an
+error and the session carries on.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from mock_open_meteo import default_cell_size, start_server
+
+
+app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_app.py")
+data_types = ["Snowfall", "Rainfall", "Total Precipitation"]
+horizons = list(range(6, 49, 6))
+# How long a closed session's state is given to be released before the worker's memory is read
+settle_seconds = 2
+
+
+# Resident set size of a process in bytes, from /proc (Linux only, else NaN)
+def resident_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return float("nan")
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_worker(port, env):
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", app_path,
+            "--server.port", str(port),
+            "--server.address", "127.0.0.1",
+            "--server.headless", "true",
+            # The driver is not a browser: it has no XSRF cookie to present
+            "--server.enableXsrfProtection", "false",
+            "--browser.gatherUsageStats", "false",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+# One browser tab: a websocket session speaking Streamlit's protocol
+class Session:
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.websocket = None
+        self.widgets = {}  # element type -> (widget id, fragment id, disabled)
+        self.states = {}  # widget id -> WidgetState last sent
+
+    async def connect(self):
+        import websockets
+
+        self.websocket = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    # Send a rerun (of the whole page, or of one fragment) and read messages until the script finishes.
+    # Returns the number of errors: exceptions the page shows, a compile error or a timeout.
+    async def rerun(self, fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        await self.websocket.send(message.SerializeToString())
+        try:
+            return await asyncio.wait_for(self.read_until_finished(), self.timeout)
+        except asyncio.TimeoutError:
+            return 1
+
+    async def read_until_finished(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        errors = 0
+        while True:
+            message = ForwardMsg()
+            message.ParseFromString(await self.websocket.recv())
+            kind = message.WhichOneof("type")
+            if kind == "script_finished":
+                return errors + (message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR)
+            if kind != "delta" or message.delta.WhichOneof("type") != "new_element":
+                continue
+            element = message.delta.new_element
+            element_type = element.WhichOneof("type")
+            if element_type == "exception":
+                errors += 1
+            elif element_type in ("slider", "radio"):
+                widget = getattr(element, element_type)
+                self.widgets[element_type] = (widget.id, message.delta.fragment_id, widget.disabled)
+
+    # One interaction: move the slider or switch the type when the page shows them, else a plain rerun
+    async def interact(self, rng):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        slider = self.widgets.get("slider")
+        radio = self.widgets.get("radio")
+        if slider and not slider[2] and (rng.random() < 0.5 or not radio):
+            state = WidgetState(id=slider[0])
+            state.double_array_value.data.append(rng.choice(horizons))
+            fragment_id = slider[1]
+        elif radio:
+            state = WidgetState(id=radio[0], string_value=rng.choice(data_types))
+            fragment_id = radio[1]
+        else:
+            return await self.rerun()
+        self.states[state.id] = state
+        return await self.rerun(fragment_id)
+
+
+# One user: load the page, then interact at the given mean think time. Reports (latencies, errors) to
+# results, then stays connected until release is set, so the worker's memory is read with every
+# session still open.
+async def run_session(url, seed, interactions, think, timeout, results, release):
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    session = Session(url, timeout)
+    try:
+        await session.connect()
+        started = time.perf_counter()
+        errors += await session.rerun()
+        latencies.append(time.perf_counter() - started)
+        for _ in range(interactions):
+            await asyncio.sleep(rng.expovariate(1 / think) if think > 0 else 0)
+            started = time.perf_counter()
+            errors += await session.interact(rng)
+            latencies.append(time.perf_counter() - started)
+    except Exception:
+        errors += 1
+    results.append((latencies, errors))
+    try:
+        await release.wait()
+    finally:
+        try:
+            await session.close()
+        except Exception:
+            pass
+
+
+async def wait_for_worker(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with status {process.returncode}")
+        session = Session(url, timeout)
+        try:
+            await session.connect()
+            await session.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"streamlit did not accept connections within {timeout}s")
+
+
+async def run_sessions(url, sessions, interactions, think, timeout, pid):
+    results = []
+    release = asyncio.Event()
+    tasks = [
+        asyncio.ensure_future(run_session(url, seed, interactions, think, timeout, results, release))
+        for seed in range(sessions)
+    ]
+    started = time.perf_counter()
+    while len(results) < sessions and not all(task.done() for task in tasks):
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    resident = resident_bytes(pid)
+    release.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return results, elapsed, resident
+
+
+def run_load(url, sessions, interactions, think, timeout, server, worker, baseline):
+    server.reset_stats()
+    results, elapsed, resident = asyncio.run(run_sessions(url, sessions, interactions, think, timeout, worker.pid))
+    # Let the worker drop the closed sessions before the next step
+    time.sleep(settle_seconds)
+    latencies = [latency for session_latencies, _ in results for latency in session_latencies]
+    first_loads = [session_latencies[0] for session_latencies, _ in results if session_latencies]
+    return {
+        "sessions": sessions,
+        "interactions_per_session": interactions,
+        "think_s": think,
+        "reruns": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "mean_s": statistics.fmean(latencies) if latencies else float("nan"),
+        "first_load_p95_s": percentile(first_loads, 95),
+        "upstream_requests": server.stats["requests"],
+        "upstream_locations": server.stats["locations"],
+        "upstream_bytes": server.stats["bytes_sent"],
+        # The worker's memory with every session of the step connected, and what they add to it
+        "rss_bytes": resident,
+        "rss_growth_bytes": resident - baseline,
+        "rss_per_session_bytes": (resident - baseline) / sessions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test one main_app.py worker with concurrent sessions")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10], help="Concurrent sessions per step")
+    parser.add_argument("--interactions", type=int, default=20, help="Slider/radio changes per session")
+    parser.add_argument("--think", type=float, default=0.5, help="Mean pause between interactions, in seconds")
+    parser.add_argument("--timeout", type=float, default=60, help="Longest a single rerun may take, in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock upstream delay per request, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cell-size", type=float, default=default_cell_size, help="Mock model grid spacing, in degrees")
+    parser.add_argument("--port", type=int, default=0, help="Port of the Streamlit worker (default: any free port)")
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, error_rate=args.error_rate, seed=args.seed, cell_size=args.cell_size)
+    store = tempfile.TemporaryDirectory(prefix="mtl-slopes-load-")
+    env = dict(
+        os.environ,
+        OPEN_METEO_URL=server.url,
+        OPEN_METEO_META_URL=server.meta_url,
+        FORECAST_STORE_DIR=store.name,
+        FORECAST_ARCHIVE_DIR=os.path.join(store.name, "archive"),
+        MODEL_CELL_INDEX=os.path.join(store.name, "model_cells.json"),
+        OPEN_METEO_LIMITS="1000000/60",
+    )
+    port = args.port or free_port()
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    worker = start_worker(port, env)
+    results = []
+    try:
+        asyncio.run(wait_for_worker(url, worker))
+        # Warm-up: imports, first fetch and snapshots, so the steps measure what sessions add
+        asyncio.run(run_sessions(url, 1, 1, 0, args.timeout, worker.pid))
+        time.sleep(settle_seconds)
+        baseline = resident_bytes(worker.pid)
+        for sessions in args.sessions:
+            results.append(
+                run_load(url, sessions, args.interactions, args.think, args.timeout, server, worker, baseline)
+            )
+    finally:
+        worker.terminate()
+        try:
+            worker.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+        server.shutdown()
+        store.cleanup()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "latency_s": args.latency,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+        "worker_baseline_rss_bytes": baseline,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Worker RSS after warm-up: {baseline / 2 ** 20:.1f} MB")
+    print(
+        f"{'sessions':>9}{'reruns':>8}{'errors':>8}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'reqs':>7}{'RSS MB':>9}{'MB/sess':>9}"
+    )
+    for row in results:
+        print(
+            f"{row['sessions']:>9}{row['reruns']:>8}{row['errors']:>8}{row['throughput_rps']:>8.1f}"
+            f"{row['p50_s'] * 1e3:>9.1f}{row['p95_s'] * 1e3:>9.1f}{row['p99_s'] * 1e3:>9.1f}"
+            f"{row['upstream_requests']:>7}{row['rss_bytes'] / 2 ** 20:>9.1f}{row['rss_per_session_bytes'] / 2 ** 20:>9.2f}"
+        )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Prometheus text exposition, written to METRICS_FILE (node_exporter textfile collector) after each
+# rerun and/or served on METRICS_PORT at /metrics
+metrics_file = os.environ.get("METRICS_FILE", "")
+metrics_port = int(os.environ.get("METRICS_PORT", "0"))
+metric_prefix = "mtl_slopes_"
+# Upper bounds of the span duration histogram, in seconds
+span_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+metric_help = {
+    "span_seconds": "Time spent per rerun phase, by phase and station",
+    "upstream_requests_total": "Open-Meteo requests by HTTP status, or 'error' when no response came back",
+    "upstream_retries_total": "Open-Meteo requests retried after a failure",
+    "upstream_bytes_total": "Response bytes received from Open-Meteo",
+    "upstream_decode_errors_total": "Open-Meteo responses whose JSON body could not be decoded",
+    "upstream_binary_fallbacks_total": "FlatBuffers responses that failed to decode, switching the client to JSON",
+    "upstream_meta_requests_total": "Model metadata checks by HTTP status (304 when the run is unchanged)",
+    "model_run_changes_total": "New upstream model runs detected from the metadata",
+    "grid_refreshes_total": "Refreshed station grids, by whether the new run changed their data",
+    "incomplete_grids_total": "Fetched station grids missing points of a failed request, dropped for a retry",
+    "snapshots_mapped": "Station snapshots currently memory-mapped and shared by this process",
+    "cache_hits_total": "Station grids served from the memory cache or a disk snapshot",
+    "cache_misses_total": "Station grids that had to be fetched upstream",
+    "single_flight_joins_total": "Station fetches that joined one already in flight instead of going upstream",
+    "stale_served_total": "Station grids of an older model run served while the new run is fetched",
+    "archive_errors_total": "Refreshed grids that could not be written to the forecast archive",
+    "bytes_sent_total": "HTML bytes handed to the browser, by payload kind",
+    "layer_points_total": "Heatmap points handed to pydeck",
+    "upstream_quota_used_total": "Open-Meteo calls charged against the quota",
+    "upstream_quota_deferred_total": "Station refreshes put off because the quota was running low",
+    "upstream_quota_rejected_total": "Open-Meteo requests dropped because the quota would not refill in time",
+    "upstream_quota_remaining": "Open-Meteo calls left in each quota window",
+}
+
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in items
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+# Process-wide counters and span histograms, shared by every session and the fetch threads
+class MetricsRegistry:
+    def __init__(self, buckets=span_buckets):
+        self.buckets = buckets
+        self.counters = {}
+        self.gauges = {}
+        # (phase, station) labels -> [count per bucket..., count over the last bucket], total seconds, last seconds
+        self.spans = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, phase, seconds, **labels):
+        key = label_key({"phase": phase, **labels})
+        with self.lock:
+            span = self.spans.get(key)
+            if span is None:
+                span = self.spans[key] = [[0] * (len(self.buckets) + 1), 0.0, 0.0]
+            span[0][bisect_left(self.buckets, seconds)] += 1
+            span[1] += seconds
+            span[2] = seconds
+
+    @contextmanager
+    def span(self, phase, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started, **labels)
+
+    # Plain rows for the debug panel: one per span and one per counter
+    def summary(self):
+        with self.lock:
+            spans = [
+                {
+                    **dict(key),
+                    "count": sum(counts),
+                    "mean_ms": round(total / max(sum(counts), 1) * 1e3, 2),
+                    "last_ms": round(last * 1e3, 2),
+                }
+                for key, (counts, total, last) in sorted(self.spans.items())
+            ]
+            counters = [
+                {"metric": name, "labels": format_labels(key), "value": value}
+                for (name, key), value in sorted({**self.counters, **self.gauges}.items())
+            ]
+        return spans, counters
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            name = metric_prefix + "span_seconds"
+            lines += [f"# HELP {name} {metric_help['span_seconds']}", f"# TYPE {name} histogram"]
+            for key, (counts, total, _) in sorted(self.spans.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(key, le=str(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(key, le='+Inf')} {sum(counts)}")
+                lines.append(f"{name}_sum{format_labels(key)} {total:.6f}")
+                lines.append(f"{name}_count{format_labels(key)} {sum(counts)}")
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                for metric in sorted({metric for metric, _ in values}):
+                    name = metric_prefix + metric
+                    lines += [f"# HELP {name} {metric_help.get(metric, metric)}", f"# TYPE {name} {kind}"]
+                    for (other, key), value in sorted(values.items()):
+                        if other == metric:
+                            lines.append(f"{name}{format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    # Atomic write, so a scraper never reads a half-written file
+    def write_file(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+
+def inc(name, value=1, **labels):
+    registry.inc(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    registry.set_gauge(name, value, **labels)
+
+
+def observe(phase, seconds, **labels):
+    registry.observe(phase, seconds, **labels)
+
+
+def span(phase, **labels):
+    return registry.span(phase, **labels)
+
+
+def export_metrics(path=metrics_file):
+    if not path:
+        return
+    try:
+        registry.write_file(path)
+    except OSError:
+        pass  # Metrics never break a rerun
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        payload = self.server.registry.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+# Serve /metrics on a background thread; returns None when the port is taken by another worker
+def start_metrics_server(port=metrics_port, host="0.0.0.0", metrics_registry=None):
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    server.registry = metrics_registry or registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,272 @@
+"""Offline stand-in for the Open-Meteo /v1/forecast endpoint.
+
+Serves deterministic synthetic hourly series for any list of coordinates, with configurable
+latency and error rate, and counts requests and bytes so benchmarks can report upstream cost.
+
+    python mock_open_meteo.py --port 8765 --latency 0.05 --error-rate 0.02
+    OPEN_METEO_URL=http://127.0.0.1:8765/v1/forecast \
+    OPEN_METEO_META_URL='http://127.0.0.1:8765/data/{model}/static/meta.json' streamlit run main_app.py
+
+GET /advance-run publishes a new model run in meta.json, to exercise incremental refreshes.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+default_start = "2025-01-15T00:00"
+# Spacing of the synthetic model grid; every point is served from its nearest cell, like a real model
+default_cell_size = 0.025
+# Interval between synthetic model runs, as advertised in meta.json
+model_update_seconds = 6 * 3600
+# Share of hours with precipitation, and the largest hourly amount per variable
+variable_profiles = {
+    "snowfall": (0.35, 1.4),
+    "rain": (0.15, 2.0),
+    "precipitation": (0.45, 2.5),
+}
+
+
+def synthetic_series(lat, lon, variable, num_hours, seed=0):
+    # Seeded from the rounded coordinates so every run and every server returns the same numbers
+    key = f"{seed}:{lat:.4f}:{lon:.4f}:{variable}".encode()
+    rng = random.Random(zlib.crc32(key))
+    wet_share, peak = variable_profiles.get(variable, (0.3, 1.0))
+    return [round(rng.uniform(0, peak), 2) if rng.random() < wet_share else 0.0 for _ in range(num_hours)]
+
+
+# Cold hours around -4 °C with a daily cycle, so downscaled points straddle the snow/rain line
+def synthetic_temperature(lat, lon, num_hours, seed=0):
+    rng = random.Random(zlib.crc32(f"{seed}:{lat:.4f}:{lon:.4f}:temperature_2m".encode()))
+    base = rng.uniform(-8, 0)
+    return [round(base + 4 * math.sin(2 * math.pi * (h - 9) / 24) + rng.uniform(-1, 1), 1) for h in range(num_hours)]
+
+
+# Grid-cell height, what Open-Meteo reports when its own downscaling is off (elevation=nan)
+def synthetic_elevation(lat, lon):
+    return float(200 + zlib.crc32(f"{lat:.4f}:{lon:.4f}".encode()) % 500)
+
+
+def snap_to_cell(value, cell_size):
+    if not cell_size:
+        return value
+    return round(round(value / cell_size) * cell_size, 5)
+
+
+def location_payload(lat, lon, variables, num_hours, start, seed, cell_elevation=False):
+    times = [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(num_hours)]
+    hourly = {"time": times}
+    for variable in variables:
+        if variable == "temperature_2m":
+            hourly[variable] = synthetic_temperature(lat, lon, num_hours, seed)
+        else:
+            hourly[variable] = synthetic_series(lat, lon, variable, num_hours, seed)
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "generationtime_ms": 0.1,
+        "utc_offset_seconds": -18000,
+        "timezone": "America/Toronto",
+        "timezone_abbreviation": "EST",
+        "elevation": synthetic_elevation(lat, lon) if cell_elevation else 500.0,
+        "hourly_units": {
+            "time": "iso8601",
+            **{variable: "°C" if variable == "temperature_2m" else "cm" for variable in variables},
+        },
+        "hourly": hourly,
+    }
+
+
+class MockOpenMeteoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency=0.0,
+        latency_jitter=0.0,
+        error_rate=0.0,
+        seed=0,
+        start=default_start,
+        cell_size=default_cell_size,
+    ):
+        super().__init__(address, MockOpenMeteoHandler)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.start = datetime.fromisoformat(start)
+        self.cell_size = cell_size
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        # Every model shares one synthetic run, initialised at the start of the series
+        self.model_run = int(self.start.replace(tzinfo=timezone.utc).timestamp())
+        self.reset_stats()
+
+    # Publish the next model run; the series themselves stay the same
+    def advance_run(self):
+        with self.lock:
+            self.model_run += model_update_seconds
+            return self.model_run
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": 0, "errors": 0, "locations": 0, "bytes_sent": 0, "meta_requests": 0}
+
+    def record(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    @property
+    def meta_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/data/{{model}}/static/meta.json"
+
+
+class MockOpenMeteoHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    # meta.json of any model, with an ETag so unchanged runs can be answered with a 304
+    def send_meta(self):
+        server = self.server
+        etag = f'"{server.model_run}"'
+        server.record(meta_requests=1)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        payload = json.dumps({
+            "last_run_initialisation_time": server.model_run,
+            "last_run_availability_time": server.model_run + 3 * 3600,
+            "update_interval_seconds": model_update_seconds,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_json(self, status, body):
+        payload = json.dumps(body, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        return len(payload)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            self.send_json(200, server.stats)
+            return
+        if url.path == "/reset":
+            server.reset_stats()
+            self.send_json(200, {"reset": True})
+            return
+        if url.path == "/advance-run":
+            self.send_json(200, {"last_run_initialisation_time": server.advance_run()})
+            return
+        if url.path.startswith("/data/") and url.path.endswith("/static/meta.json"):
+            self.send_meta()
+            return
+        if url.path != "/v1/forecast":
+            self.send_json(404, {"error": True, "reason": "Not found"})
+            return
+
+        with server.lock:
+            delay = server.latency + server.rng.uniform(0, server.latency_jitter)
+            failed = server.rng.random() < server.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            sent = self.send_json(503, {"error": True, "reason": "Synthetic upstream error"})
+            server.record(requests=1, errors=1, bytes_sent=sent)
+            return
+
+        query = parse_qs(url.query)
+        try:
+            lats = [float(value) for value in query["latitude"][0].split(",")]
+            lons = [float(value) for value in query["longitude"][0].split(",")]
+        except (KeyError, ValueError):
+            sent = self.send_json(400, {"error": True, "reason": "Invalid latitude/longitude"})
+            server.record(requests=1, errors=1, bytes_sent=sent)
+            return
+        if len(lats) != len(lons):
+            sent = self.send_json(400, {"error": True, "reason": "Latitude and longitude lists differ in length"})
+            server.record(requests=1, errors=1, bytes_sent=sent)
+            return
+        variables = [v for v in query.get("hourly", [""])[0].split(",") if v]
+        num_hours = 24 * int(query.get("forecast_days", ["7"])[0])
+        cell_elevation = query.get("elevation", [""])[0].split(",")[0] == "nan"
+        locations = [
+            location_payload(
+                snap_to_cell(lat, server.cell_size),
+                snap_to_cell(lon, server.cell_size),
+                variables,
+                num_hours,
+                server.start,
+                server.seed,
+                cell_elevation,
+            )
+            for lat, lon in zip(lats, lons)
+        ]
+        # Like Open-Meteo: one location comes back as an object, several as a list
+        sent = self.send_json(200, locations[0] if len(locations) == 1 else locations)
+        server.record(requests=1, locations=len(locations), bytes_sent=sent)
+
+
+# Start a server on a background thread; port 0 picks a free port (see server.url)
+def start_server(port=0, host="127.0.0.1", **options):
+    server = MockOpenMeteoServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Open-Meteo forecast stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed delay per request, in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Extra random delay, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", default=default_start, help="First timestamp of every series")
+    parser.add_argument("--cell-size", type=float, default=default_cell_size, help="Model grid spacing, in degrees")
+    args = parser.parse_args()
+    server = MockOpenMeteoServer(
+        (args.host, args.port),
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        start=args.start,
+        cell_size=args.cell_size,
+    )
+    print(f"Serving synthetic forecasts on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+
+index_path = os.environ.get("MODEL_CELL_INDEX", os.path.join("forecast_store", "model_cells.json"))
+
+
+def point_key(coord):
+    # Same rounding as the coordinates sent upstream
+    return (round(float(coord["lat"]), 5), round(float(coord["lon"]), 5))
+
+
+# Maps requested points to the model cell Open-Meteo actually serves them from (the latitude/longitude
+# it echoes back). Once a cell is known, one representative point is fetched for it and its series is
+# fanned back out to every other point in the same cell.
+class ModelGridIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self.cells = {}  # point key -> cell key
+        self.representatives = {}  # cell key -> point key fetched for that cell
+        self.lock = threading.Lock()
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for point_lat, point_lon, cell_lat, cell_lon in entries:
+            self.cells[(point_lat, point_lon)] = (cell_lat, cell_lon)
+            self.representatives.setdefault((cell_lat, cell_lon), (point_lat, point_lon))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        entries = [[*point, *cell] for point, cell in self.cells.items()]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    # Coordinates to request (one per known cell, plus every point not seen yet) and, for each input
+    # coordinate, the index of the requested coordinate that serves it
+    def plan(self, coords):
+        request_coords = []
+        sources = []
+        requested = {}
+        with self.lock:
+            for coord in coords:
+                key = point_key(coord)
+                cell = self.cells.get(key)
+                source = self.representatives.get(cell, key) if cell else key
+                if source not in requested:
+                    requested[source] = len(request_coords)
+                    request_coords.append({"lat": source[0], "lon": source[1]})
+                sources.append(requested[source])
+        return request_coords, sources
+
+    def learn(self, request_coords, locations):
+        changed = False
+        with self.lock:
+            for coord, location in zip(request_coords, locations):
+                if not location or "latitude" not in location:
+                    continue
+                key = point_key(coord)
+                cell = (location["latitude"], location["longitude"])
+                previous = self.cells.get(key)
+                if previous == cell:
+                    continue
+                if previous is not None:
+                    # The served model grid moved: relearn every point of the old cell individually
+                    self.forget(previous)
+                self.cells[key] = cell
+                self.representatives.setdefault(cell, key)
+                changed = True
+            if changed and self.path:
+                try:
+                    self.save()
+                except OSError:
+                    pass
+
+    def forget(self, cell):
+        self.representatives.pop(cell, None)
+        for key in [key for key, known in self.cells.items() if known == cell]:
+            del self.cells[key]
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def default_cell_index():
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = ModelGridIndex(index_path)
+        return _default_index
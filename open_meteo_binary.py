@@ -0,0 +1,54 @@
+import importlib.util
+import os
+
+import numpy as np
+
+
+# Open-Meteo's FlatBuffers format (format=flatbuffers) carries every series as a float32 array with
+# a start time and interval instead of one JSON number and one timestamp string per hour. Decoding
+# needs the openmeteo_sdk package, imported only when a binary response is actually decoded.
+binary_format = os.environ.get("OPEN_METEO_FORMAT", "flatbuffers")
+
+
+def binary_available():
+    return binary_format == "flatbuffers" and importlib.util.find_spec("openmeteo_sdk") is not None
+
+
+# Coordinates come back as float32; format them the way the JSON API prints them, so model cells
+# learned from either format share the same key
+def json_float(value):
+    return float(str(np.float32(value)))
+
+
+# Split a FlatBuffers body (size-prefixed messages, one per location, in request order) into location
+# dicts shaped like the JSON ones. Each hourly series is a read-only numpy view into the body, in the
+# order of the requested variables, and "hourly_start" (Unix seconds, UTC) replaces the time strings.
+# Raises ValueError when the body is not a valid FlatBuffers response.
+def decode_locations(content, variables):
+    from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+    locations = []
+    position = 0
+    try:
+        while position < len(content):
+            length = int.from_bytes(content[position:position + 4], byteorder="little")
+            message = WeatherApiResponse.GetRootAs(content, position + 4)
+            position += length + 4
+            hourly = message.Hourly()
+            if hourly is None or hourly.VariablesLength() != len(variables):
+                raise ValueError("Hourly variables don't match the request")
+            locations.append({
+                "latitude": json_float(message.Latitude()),
+                "longitude": json_float(message.Longitude()),
+                "elevation": float(message.Elevation()),
+                "utc_offset_seconds": int(message.UtcOffsetSeconds()),
+                "hourly_start": int(hourly.Time()),
+                "hourly": {
+                    variable: hourly.Variables(i).ValuesAsNumpy() for i, variable in enumerate(variables)
+                },
+            })
+    except ValueError:
+        raise
+    except Exception as error:
+        raise ValueError(f"Invalid FlatBuffers response: {error}") from error
+    return locations
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import inc, span
+from open_meteo_binary import binary_available, decode_locations
+from upstream_quota import default_quota, max_quota_wait, params_cost
+
+
+open_meteo_url = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+# Per-model metadata with the latest run; a static file, so checking it costs no API call
+open_meteo_meta_url = os.environ.get(
+    "OPEN_METEO_META_URL", "https://api.open-meteo.com/data/{model}/static/meta.json"
+)
+max_concurrency = int(os.environ.get("OPEN_METEO_MAX_CONCURRENCY", "8"))
+retry_statuses = {429, 500, 502, 503, 504}
+
+
+# Async front end over one pooled, keep-alive requests session.
+# Blocking calls run on worker threads, so the same client serves the Streamlit script
+# (through the *_sync helpers) and a standalone asyncio refresher.
+class OpenMeteoClient:
+    def __init__(
+        self,
+        base_url=open_meteo_url,
+        max_concurrency=max_concurrency,
+        connect_timeout=3.05,
+        read_timeout=10,
+        deadline=30,
+        max_retries=3,
+        backoff_base=0.5,
+        backoff_cap=8,
+        quota=None,
+        max_quota_wait=max_quota_wait,
+        meta_url=open_meteo_meta_url,
+    ):
+        self.base_url = base_url
+        self.meta_url = meta_url
+        self.meta_cache = {}  # url -> (ETag, last run initialisation time)
+        # Ask for FlatBuffers until upstream answers with something that doesn't decode
+        self.binary = binary_available()
+        self.max_concurrency = max_concurrency
+        self.timeout = (connect_timeout, read_timeout)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.quota = quota
+        self.max_quota_wait = max_quota_wait
+        self.session = requests.Session()
+        # pool_block makes every thread wait for a free connection, which caps concurrent
+        # upstream connections process-wide, across sessions and event loops
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # Full-jitter exponential backoff, honouring Retry-After when upstream sends one
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_cap)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    # Charge a call to the quota, waiting for a short window to refill; False when upstream is off limits
+    async def reserve_quota(self, cost):
+        while self.quota is not None:
+            wait = self.quota.try_acquire(cost)
+            if wait == 0:
+                return True
+            if wait > self.max_quota_wait:
+                inc("upstream_quota_rejected_total")
+                return False
+            await asyncio.sleep(wait)
+        return True
+
+    # Returns the successful response, or None once retries are exhausted, on a non-retryable error
+    # or when the quota has no room for the call. Transport failures (connection, timeout, a body cut
+    # off mid-transfer) are retried.
+    async def get_response(self, params, semaphore=None):
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+        cost = params_cost(params)
+        for attempt in range(self.max_retries + 1):
+            response = None
+            if not await self.reserve_quota(cost):
+                return None
+            async with semaphore:
+                try:
+                    with span("upstream_request"):
+                        response = await asyncio.to_thread(
+                            self.session.get, self.base_url, params=params, timeout=self.timeout
+                        )
+                except requests.RequestException:
+                    inc("upstream_requests_total", status="error")
+                else:
+                    inc("upstream_requests_total", status=response.status_code)
+                    inc("upstream_bytes_total", len(response.content))
+                    if response.status_code == 200:
+                        return response
+                    if response.status_code not in retry_statuses:
+                        return None
+            if attempt < self.max_retries:
+                inc("upstream_retries_total")
+                await asyncio.sleep(self._backoff(attempt, response))
+        return None
+
+    # Decoded body, or None when the request failed or the body isn't valid JSON
+    async def get_json(self, params, semaphore=None):
+        response = await self.get_response(params, semaphore)
+        if response is None:
+            return None
+        try:
+            with span("upstream_decode", format="json"):
+                return response.json()
+        except ValueError:
+            inc("upstream_decode_errors_total")
+            return None
+
+    # Locations of a batch request in request order, or None when it failed. Decoded from FlatBuffers
+    # straight into numpy arrays when openmeteo_sdk is installed, else from JSON; a response that isn't
+    # valid FlatBuffers switches this client to JSON for good.
+    async def get_locations(self, params, semaphore=None):
+        if self.binary:
+            response = await self.get_response({**params, "format": "flatbuffers"}, semaphore)
+            if response is None:
+                return None
+            # Servers without the binary format ignore the parameter and answer with JSON, which is
+            # decoded as is rather than requested again
+            if response.headers.get("Content-Type", "").startswith("application/json"):
+                inc("upstream_binary_fallbacks_total")
+                self.binary = False
+                try:
+                    with span("upstream_decode", format="json"):
+                        data = response.json()
+                except ValueError:
+                    inc("upstream_decode_errors_total")
+                    return None
+            else:
+                try:
+                    with span("upstream_decode", format="flatbuffers"):
+                        return decode_locations(response.content, params["hourly"].split(","))
+                except ValueError:
+                    inc("upstream_binary_fallbacks_total")
+                    self.binary = False
+                data = await self.get_json(params, semaphore)
+        else:
+            data = await self.get_json(params, semaphore)
+        if data is None:
+            return None
+        # A single location comes back as an object, several locations as a list in request order
+        return data if isinstance(data, list) else [data]
+
+    # Fetch every parameter set concurrently, bounded by max_concurrency and an overall deadline.
+    # Results keep the order of params_list; raises TimeoutError if the deadline passes.
+    async def get_json_many(self, params_list):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.wait_for(
+            asyncio.gather(*(self.get_json(params, semaphore) for params in params_list)),
+            self.deadline,
+        )
+
+    # Unix time of the latest run of a model, from its meta.json. Revalidated with the ETag of the last
+    # answer, so an unchanged run costs a 304 and no body. None when the metadata is unavailable.
+    def get_model_run(self, model):
+        url = self.meta_url.format(model=model)
+        cached = self.meta_cache.get(url)
+        headers = {"If-None-Match": cached[0]} if cached and cached[0] else {}
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            inc("upstream_meta_requests_total", status="error")
+            return None
+        inc("upstream_meta_requests_total", status=response.status_code)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if response.status_code != 200:
+            return None
+        try:
+            run = int(response.json()["last_run_initialisation_time"])
+        except (ValueError, KeyError, TypeError):
+            return None
+        self.meta_cache[url] = (response.headers.get("ETag"), run)
+        return run
+
+    def get_json_many_sync(self, params_list):
+        return asyncio.run(self.get_json_many(params_list))
+
+    def close(self):
+        self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+# Process-wide client so every session shares the same connection pool
+def default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OpenMeteoClient(quota=default_quota())
+        return _default_client
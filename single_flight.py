@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+
+# Coalesces concurrent fetches of the same key: the first caller gets to fetch it, every later caller
+# waits on the same future until the owner resolves it, so upstream sees one request per key at a time
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    # Future for every key, and the keys nobody was fetching yet, which the caller must now fetch
+    def join(self, keys):
+        futures = {}
+        owned = []
+        with self.lock:
+            for key in keys:
+                future = self.flights.get(key)
+                if future is None:
+                    future = self.flights[key] = Future()
+                    owned.append(key)
+                futures[key] = future
+        return futures, owned
+
+    # Hand the result to every waiter; later calls for the same key start a new flight. Owners pass the
+    # future join gave them, so a flight another caller started for the key since then is left alone,
+    # and resolving the same future twice keeps the first result.
+    def resolve(self, key, value, future=None):
+        with self.lock:
+            current = self.flights.get(key)
+            if future is None:
+                future = current
+            if current is not None and current is future:
+                del self.flights[key]
+        if future is not None:
+            try:
+                future.set_result(value)
+            except InvalidStateError:
+                pass
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.flights)
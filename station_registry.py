@@ -0,0 +1,35 @@
+import json
+import os
+from dataclasses import dataclass
+
+
+registry_path = os.environ.get(
+    "STATION_REGISTRY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "stations.json")
+)
+
+
+@dataclass
+class Station:
+    name: str
+    title: str
+    bbox: tuple  # (lat_min, lat_max, lon_min, lon_max)
+    points_per_side: int
+    view_state: dict  # pydeck ViewState arguments
+    trails: int = None
+    lifts: int = None
+    altitude_m: int = None
+
+    # Grid definition accepted by generate_coordinates and used as the cache/snapshot key
+    @property
+    def grid(self):
+        return (*self.bbox, self.points_per_side)
+
+
+def load_stations(path=registry_path):
+    with open(path) as f:
+        entries = json.load(f)
+    return [Station(**{**entry, "bbox": tuple(entry["bbox"])}) for entry in entries]
+
+
+stations = load_stations()
+station_grids = {station.name: station.grid for station in stations}
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from forecast_engine import StationGrid, carry_forward, data_types, summarize_grid
+
+
+# Three points over two model cells and three hours; cell 0 gets 1 mm per hour of every type,
+# cell 1 gets 2 mm per hour
+def small_grid(scale=1.0, **changes):
+    hourly = np.array([1.0, 2.0])[:, None, None] * np.ones((2, 3, len(data_types))) * scale
+    fields = {
+        "lats": np.array([45.0, 45.1, 45.2]),
+        "lons": np.array([-74.0, -74.1, -74.2]),
+        "hours": np.arange(3),
+        "cumulative": np.cumsum(hourly, axis=1),
+        "point_cells": np.array([0, 0, 1], dtype=np.int32),
+        "start": "2025-01-15T00:00:00+00:00",
+    }
+    fields.update(changes)
+    return StationGrid(**fields)
+
+
+def test_grid_arrays_are_read_only_float32():
+    grid = small_grid()
+    assert grid.cumulative.dtype == np.float32
+    with pytest.raises(ValueError):
+        grid.cumulative[0, 0, 0] = 1.0
+
+
+def test_carry_forward_without_previous_grid():
+    grid = small_grid()
+    assert carry_forward(None, grid) == (grid, True)
+
+
+def test_carry_forward_keeps_an_identical_grid():
+    previous = small_grid()
+    previous.summary
+    kept, changed = carry_forward(previous, small_grid())
+    assert kept is previous
+    assert not changed
+    assert "summary" in kept.__dict__
+
+
+def test_carry_forward_reuses_the_layout_of_a_changed_grid():
+    previous = small_grid()
+    kept, changed = carry_forward(previous, small_grid(scale=2.0))
+    assert changed
+    assert kept is not previous
+    assert kept.lats is previous.lats
+    assert kept.point_cells is previous.point_cells
+    assert kept.at(data_types[0], 2).tolist() == [6.0, 6.0, 12.0]
+
+
+@pytest.mark.parametrize("changes", [
+    {"lats": np.array([45.0, 45.1, 45.3])},
+    {"start": "2025-01-15T06:00:00+00:00"},
+    {"dem": "dem.npy@1"},
+])
+def test_carry_forward_replaces_a_grid_of_another_layout(changes):
+    grid = small_grid(**changes)
+    assert carry_forward(small_grid(), grid) == (grid, True)
+
+
+def test_summarize_grid_over_points():
+    summary = summarize_grid(small_grid(), hours=(1, 2), percentiles=(50,))
+    assert set(summary) == set(data_types)
+    # Points hold 2, 2 and 4 mm after hour 1, and 3, 3 and 6 mm after hour 2
+    assert summary[data_types[0]][1] == pytest.approx({"mean": 8 / 3, "max": 4.0, "p50": 2.0})
+    assert summary[data_types[0]][2] == pytest.approx({"mean": 4.0, "max": 6.0, "p50": 3.0})
+
+
+def test_summarize_grid_past_the_last_hour_uses_the_last_one():
+    summary = summarize_grid(small_grid(), hours=(48,), percentiles=(90,))
+    assert summary[data_types[-1]][48]["max"] == pytest.approx(6.0)
+
+
+def test_summarize_empty_grid():
+    grid = small_grid(
+        lats=np.array([]), lons=np.array([]), cumulative=np.zeros((0, 3, len(data_types))),
+        point_cells=np.array([], dtype=np.int32),
+    )
+    assert summarize_grid(grid) == {}
@@ -0,0 +1,57 @@
+import threading
+
+from single_flight import SingleFlight
+
+
+def test_first_caller_owns_and_later_callers_wait():
+    flights = SingleFlight()
+    futures, owned = flights.join(["a", "b"])
+    joined, joined_owned = flights.join(["a", "c"])
+    assert owned == ["a", "b"]
+    assert joined_owned == ["c"]
+    assert joined["a"] is futures["a"]
+    assert flights.in_flight() == 3
+
+
+def test_resolve_hands_the_value_to_every_waiter():
+    flights = SingleFlight()
+    futures, _ = flights.join(["a"])
+    joined, _ = flights.join(["a"])
+    flights.resolve("a", "grid", futures["a"])
+    assert futures["a"].result(timeout=0) == "grid"
+    assert joined["a"].result(timeout=0) == "grid"
+    assert flights.in_flight() == 0
+
+
+def test_resolving_again_leaves_a_newer_flight_alone():
+    flights = SingleFlight()
+    first, _ = flights.join(["a"])
+    flights.resolve("a", "grid", first["a"])
+    # Another session missed the cache and started its own flight for the same key
+    second, owned = flights.join(["a"])
+    assert owned == ["a"]
+    flights.resolve("a", None, first["a"])
+    assert first["a"].result(timeout=0) == "grid"
+    assert not second["a"].done()
+    assert flights.in_flight() == 1
+    flights.resolve("a", "newer grid", second["a"])
+    assert second["a"].result(timeout=0) == "newer grid"
+    assert flights.in_flight() == 0
+
+
+def test_concurrent_joins_elect_a_single_owner():
+    flights = SingleFlight()
+    barrier = threading.Barrier(8)
+    owners = []
+
+    def join():
+        barrier.wait()
+        _, owned = flights.join(["a"])
+        owners.extend(owned)
+
+    threads = [threading.Thread(target=join) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert owners == ["a"]
@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from upstream_quota import QuotaScheduler, call_cost, parse_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_limits_and_call_cost():
+    assert parse_limits("600/60,10000/86400") == [(600.0, 60.0), (10000.0, 86400.0)]
+    assert call_cost(100) == 100
+    assert call_cost(100, variables=11, days=15) == 400
+
+
+def test_try_acquire_charges_every_bucket_or_none():
+    clock = FakeClock()
+    quota = QuotaScheduler([(10, 60), (100, 3600)], clock)
+    assert quota.try_acquire(8) == 0
+    # The minute bucket holds 2 and refills 1 call every 6 s
+    assert quota.try_acquire(5) == pytest.approx(18)
+    assert quota.usage() == {"used": 8, "remaining": {"60s": 2, "3600s": 92}}
+    clock.now += 18
+    assert quota.try_acquire(5) == 0
+    assert quota.usage()["used"] == 13
+
+
+def test_try_acquire_never_fits_a_cost_over_capacity():
+    quota = QuotaScheduler([(10, 60)], FakeClock())
+    assert quota.try_acquire(11) == math.inf
+    assert quota.usage()["used"] == 0
+
+
+def test_admit_in_priority_order_within_the_budget():
+    quota = QuotaScheduler([(100, 86400)], FakeClock())
+    candidates = [(2, 30, "c"), (0, 50, "a"), (1, 40, "b")]
+    # Only 10 calls are left above the reserve once a and b are in
+    assert quota.admit(candidates, essential=lambda item: True, max_wait=0) == ["a", "b"]
+
+
+def test_admit_keeps_the_reserve_for_essential_refreshes():
+    quota = QuotaScheduler([(100, 86400)], FakeClock())
+    candidates = [(0, 95, "stale"), (1, 95, "missing")]
+    assert quota.admit(candidates, essential=lambda item: item == "missing", max_wait=0) == ["missing"]
+
+
+def test_admit_checks_every_window_with_its_refill():
+    clock = FakeClock()
+    quota = QuotaScheduler([(60, 60), (10000, 86400)], clock)
+    assert quota.try_acquire(60) == 0
+    candidates = [(0, 5, "small"), (1, 20, "large")]
+    # The minute bucket is empty but refills 5 calls within a 5 s wait
+    assert quota.admit(candidates, max_wait=5) == ["small"]
+    assert quota.admit(candidates, max_wait=0) == []
+
+
+def test_schedulers_on_one_store_share_the_buckets(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "quota.sqlite")
+    worker = QuotaScheduler([(100, 60)], clock, path=path)
+    cron = QuotaScheduler([(100, 60)], clock, path=path)
+    assert worker.try_acquire(80) == 0
+    assert cron.try_acquire(30) == pytest.approx(6)
+    assert cron.usage()["remaining"] == {"60s": 20}
+    clock.now += 6
+    assert cron.try_acquire(30) == 0
+    assert worker.usage()["remaining"] == {"60s": 0}
@@ -0,0 +1,54 @@
+import base64
+import json
+
+import numpy as np
+from assets import load_template
+from forecast_engine import timeline_weights
+
+
+map_height = 460
+frame_ms = 700
+
+
+def encode(array):
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode()
+
+
+# pydeck ViewState arguments to deck.gl's camelCase view state
+def deck_view_state(view_state):
+    names = {"max_zoom": "maxZoom", "min_zoom": "minZoom", "max_pitch": "maxPitch", "min_pitch": "minPitch"}
+    return {names.get(name, name): value for name, value in view_state.items() if name != "interactive"}
+
+
+# Self-contained deck.gl page holding every forecast horizon of one station, with an in-browser
+# slider and auto-play, so scrubbing through time costs no Streamlit rerun. Built once per grid and
+# type, and shared by every session.
+def timeline_map_html(station, station_grid, data_type, horizons, heatmap_settings):
+    key = ("timeline", station.name, data_type, tuple(horizons))
+    return station_grid.memoized(
+        key, lambda: build_timeline_map_html(station, station_grid, data_type, horizons, heatmap_settings)
+    )
+
+
+def build_timeline_map_html(station, station_grid, data_type, horizons, heatmap_settings):
+    weights = np.round(timeline_weights(station_grid, data_type, horizons) * 255).astype(np.uint8)
+    positions = np.column_stack([station_grid.lons, station_grid.lats]).astype("<f4")
+    data = {
+        "horizons": list(horizons),
+        "count": len(positions),
+        "positions": encode(positions),
+        "weights": encode(weights),
+    }
+    settings = {
+        "viewState": deck_view_state(station.view_state),
+        "radiusPixels": heatmap_settings["radius_pixels"],
+        "intensity": heatmap_settings["intensity"],
+        "threshold": heatmap_settings["threshold"],
+        "colorRange": heatmap_settings["color_range"],
+        "frameMs": frame_ms,
+    }
+    return load_template("timeline_map.html").substitute(
+        data=json.dumps(data, separators=(",", ":")),
+        settings=json.dumps(settings, separators=(",", ":")),
+        map_height=map_height,
+    )
@@ -0,0 +1,197 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import inc, set_gauge
+
+
+# Open-Meteo free tier: 600 calls per minute, 5 000 per hour and 10 000 per day, as "calls/seconds"
+# pairs. A request counts one call per location, more with over 10 variables or 2 weeks of data.
+upstream_limits = os.environ.get("OPEN_METEO_LIMITS", "600/60,5000/3600,10000/86400")
+# Longest a request waits for the per-minute budget to refill before giving up on upstream
+max_quota_wait = float(os.environ.get("OPEN_METEO_MAX_QUOTA_WAIT", "5"))
+# Below this share of the daily budget, only stations with nothing to fall back on are refreshed
+reserve_share = 0.1
+# Open-Meteo counts calls per client, across every worker, CLI run and restart, so the bucket levels
+# live in a small sqlite file next to the snapshots that every process on the host charges; set empty
+# to keep them in process memory
+quota_path = os.environ.get(
+    "OPEN_METEO_QUOTA_DB", os.path.join(os.environ.get("FORECAST_STORE_DIR", "forecast_store"), "quota.sqlite")
+)
+schema = """
+CREATE TABLE IF NOT EXISTS buckets (
+    window_seconds REAL PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def parse_limits(spec):
+    limits = []
+    for part in spec.split(","):
+        calls, seconds = part.split("/")
+        limits.append((float(calls), float(seconds)))
+    return limits
+
+
+def call_cost(locations, variables=1, days=7):
+    return locations * math.ceil(variables / 10) * math.ceil(days / 14)
+
+
+def params_cost(params):
+    return call_cost(
+        params["latitude"].count(",") + 1,
+        params.get("hourly", "").count(",") + 1,
+        int(params.get("forecast_days", 7)),
+    )
+
+
+class TokenBucket:
+    def __init__(self, capacity, window_seconds, clock=time.monotonic):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.rate = capacity / window_seconds
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = max(now, self.updated)
+
+    # Seconds until cost tokens are available; inf when cost exceeds what the bucket can ever hold
+    def wait_time(self, cost):
+        if cost > self.capacity:
+            return math.inf
+        return max(cost - self.tokens, 0) / self.rate
+
+
+# One token bucket per upstream limit. A call is charged to every bucket or to none, so the
+# tightest window decides, and used totals are kept for metrics and the debug panel. With a path, the
+# bucket levels are shared through that sqlite file by every scheduler using it, in any process, so
+# the clock must be wall time; used stays per scheduler.
+class QuotaScheduler:
+    def __init__(self, limits=None, clock=time.time, path=None):
+        limits = limits if limits is not None else parse_limits(upstream_limits)
+        self.buckets = [TokenBucket(calls, seconds, clock) for calls, seconds in limits]
+        self.used = 0
+        self.path = path
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self.ready:
+            connection.executescript(schema)
+            self.ready = True
+        return connection
+
+    # Run update on the bucket levels of the shared store, loaded and saved back in one write
+    # transaction so concurrent processes charge them in turn. Without a store, or when it can't be
+    # opened, update runs on this scheduler's own buckets. Caller holds the lock.
+    def shared(self, update):
+        if not self.path:
+            return update()
+        try:
+            connection = self.connect()
+        except (OSError, sqlite3.Error):
+            return update()
+        updated = False
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = {
+                row[0]: row[1:] for row in connection.execute("SELECT window_seconds, tokens, updated FROM buckets")
+            }
+            for bucket in self.buckets:
+                if bucket.window_seconds in rows:
+                    tokens, bucket.updated = rows[bucket.window_seconds]
+                    bucket.tokens = min(tokens, bucket.capacity)
+            result = update()
+            updated = True
+            connection.executemany(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                [(bucket.window_seconds, bucket.tokens, bucket.updated) for bucket in self.buckets],
+            )
+            connection.execute("COMMIT")
+            return result
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            return result if updated else update()
+        finally:
+            connection.close()
+
+    # Charge cost now and return 0, or return how long to wait before it could be charged
+    def try_acquire(self, cost):
+        def charge():
+            for bucket in self.buckets:
+                bucket.refill()
+            wait = max((bucket.wait_time(cost) for bucket in self.buckets), default=0)
+            if wait == 0:
+                for bucket in self.buckets:
+                    bucket.tokens -= cost
+                self.used += cost
+            return wait
+
+        with self.lock:
+            wait = self.shared(charge)
+            self.publish()
+        if wait == 0:
+            inc("upstream_quota_used_total", cost)
+        return wait
+
+    # Pick the requests to send, in priority order, among (priority, cost, item) candidates: lower
+    # priority values go first, and a candidate is skipped when its cost no longer fits the budget of
+    # every window, counting what each refills within max_wait (how long the client waits for quota).
+    # Under the reserve of the longest window, only candidates flagged essential are admitted.
+    def admit(self, candidates, essential=lambda item: False, max_wait=max_quota_wait):
+        with self.lock:
+            if not self.buckets:
+                return [item for _, _, item in sorted(candidates, key=lambda candidate: candidate[0])]
+            self.shared(lambda: [bucket.refill() for bucket in self.buckets])
+            budgets = [min(bucket.capacity, bucket.tokens + bucket.rate * max_wait) for bucket in self.buckets]
+            longest = max(range(len(self.buckets)), key=lambda b: self.buckets[b].window_seconds)
+            reserve = reserve_share * self.buckets[longest].capacity
+        admitted = []
+        for _, cost, item in sorted(candidates, key=lambda candidate: candidate[0]):
+            fits = all(cost <= budget for budget in budgets)
+            if not fits or (budgets[longest] - cost < reserve and not essential(item)):
+                inc("upstream_quota_deferred_total")
+                continue
+            budgets = [budget - cost for budget in budgets]
+            admitted.append(item)
+        return admitted
+
+    # Caller holds the lock
+    def publish(self):
+        for bucket in self.buckets:
+            set_gauge("upstream_quota_remaining", bucket.tokens, window=f"{bucket.window_seconds:g}s")
+
+    def usage(self):
+        with self.lock:
+            self.shared(lambda: [bucket.refill() for bucket in self.buckets])
+            return {
+                "used": self.used,
+                "remaining": {f"{bucket.window_seconds:g}s": round(bucket.tokens, 1) for bucket in self.buckets},
+            }
+
+
+_default_quota = None
+_default_quota_lock = threading.Lock()
+
+
+# Process-wide budget shared by the default client and the refresh planner, and through quota_path
+# with the other processes on the host
+def default_quota():
+    global _default_quota
+    with _default_quota_lock:
+        if _default_quota is None:
+            _default_quota = QuotaScheduler(path=quota_path)
+        return _default_quota